@@ -27,7 +27,7 @@ class Base(DeclarativeBase):
 
 # Initialize SQLAlchemy with the Base class
 db = SQLAlchemy(model_class=Base)
-migrate = Migrate(db)
+migrate = Migrate()
 
 # Create Flask app
 app = Flask(__name__)
@@ -53,6 +53,7 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize the app with the extension
 db.init_app(app)
+migrate.init_app(app, db)
 
 # Set up Flask-Login
 login_manager = LoginManager()
@@ -0,0 +1,230 @@
+"""
+Shared TTL cache used for upstream API results.
+
+Entries expire after a per-entry TTL, the in-process store is bounded with LRU
+eviction, and concurrent misses for the same key are coalesced into a single
+upstream call. When a Redis URL is configured, values are stored in Redis so
+every gunicorn worker shares one cache; if Redis is unreachable the cache falls
+back to the in-process store.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class _LocalBackend:
+    """Bounded in-process LRU store with per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class _RedisBackend:
+    """JSON values in Redis with native key expiry; eviction is left to Redis' maxmemory policy"""
+
+    def __init__(self, client, namespace):
+        self._client = client
+        self._namespace = namespace
+
+    def _key(self, key):
+        return f'{self._namespace}:{key}'
+
+    def get(self, key):
+        raw = self._client.get(self._key(key))
+        if raw is None:
+            return _MISSING
+        return json.loads(raw)
+
+    def set(self, key, value, ttl):
+        self._client.set(self._key(key), json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self._client.delete(self._key(key))
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self._key('*')):
+            self._client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(match=self._key('*')))
+
+class _Pending:
+    """A load in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class TTLCache:
+    def __init__(self, name, maxsize=1024, ttl=60, redis_url=None):
+        """
+        Args:
+            name (str): Namespace for keys and log messages
+            maxsize (int): Maximum entries held in process
+            ttl (float): Default time-to-live in seconds
+            redis_url (str): Optional Redis URL to share the cache across processes
+        """
+        self.name = name
+        self.ttl = ttl
+        self._local = _LocalBackend(maxsize)
+        self._redis = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'loads': 0, 'errors': 0}
+
+        if redis_url:
+            try:
+                import redis
+                client = redis.Redis.from_url(redis_url, socket_timeout=1)
+                client.ping()
+                self._redis = _RedisBackend(client, f'cache:{name}')
+                logger.info(f"Cache '{name}' using Redis at {redis_url}")
+            except Exception as e:
+                logger.warning(f"Cache '{name}' falling back to in-process store: {e}")
+
+    @property
+    def _backend(self):
+        return self._redis or self._local
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _backend_call(self, method, *args):
+        """Run a backend operation, degrading to the local store if Redis fails"""
+        try:
+            return getattr(self._backend, method)(*args)
+        except Exception as e:
+            if self._redis is None:
+                raise
+            logger.warning(f"Cache '{self.name}' Redis error, using in-process store: {e}")
+            return getattr(self._local, method)(*args)
+
+    def get(self, key, default=None, count_miss=True):
+        """
+        Return a cached value or default, counting a hit or miss
+
+        Args:
+            key (str): Cache key
+            default: Value returned on a miss
+            count_miss (bool): Count a miss; False when the caller falls back to
+                another lookup that counts its own hit or miss, so one call
+                is never counted twice
+        """
+        value = self._backend_call('get', key)
+        if value is _MISSING:
+            if count_miss:
+                self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value for ttl seconds (the cache default if None)"""
+        self._backend_call('set', key, value, self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self._backend_call('delete', key)
+
+    def clear(self):
+        self._backend_call('clear')
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, calling loader once on a miss
+
+        Concurrent callers missing on the same key wait for the first caller's
+        load instead of issuing their own upstream request.
+
+        Args:
+            key (str): Cache key
+            loader (callable): Zero-argument function producing the value
+            ttl (float): Time-to-live for a freshly loaded value
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = _Pending()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            self._count('loads')
+            pending.value = loader()
+            self.set(key, pending.value, ttl)
+            return pending.value
+        except Exception as e:
+            self._count('errors')
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            pending.done.set()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['evictions'] = self._local.evictions
+        stats['backend'] = 'redis' if self._redis else 'local'
+        try:
+            stats['size'] = len(self._backend)
+        except Exception:
+            stats['size'] = None
+        return stats
@@ -6,12 +6,36 @@ from datetime import datetime, timedelta
 import yfinance as yf
 import pandas as pd
 
+from cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 # API Keys
 ALPHA_VANTAGE_API_KEY = os.environ.get("ALPHA_VANTAGE_API_KEY", "demo")
 NEWS_API_KEY = os.environ.get("NEWS_API_KEY", "demo")
 
+# Quote cache shared by every caller of Ticker.info; Redis-backed when REDIS_URL is set
+QUOTE_CACHE_TTL = int(os.environ.get("QUOTE_CACHE_TTL", 60))
+quote_cache = TTLCache(
+    'quotes',
+    maxsize=int(os.environ.get("QUOTE_CACHE_SIZE", 2048)),
+    ttl=QUOTE_CACHE_TTL,
+    redis_url=os.environ.get("REDIS_URL")
+)
+
+def get_ticker_info(symbol, ttl=None):
+    """
+    Fetches Ticker.info for a symbol through the quote cache
+    
+    Args:
+        symbol (str): Stock ticker symbol
+        ttl (int): Seconds to keep a fresh result, defaults to QUOTE_CACHE_TTL
+        
+    Returns:
+        dict: Yahoo Finance info for the symbol
+    """
+    return quote_cache.get_or_load(symbol.upper(), lambda: yf.Ticker(symbol).info or {}, ttl=ttl)
+
 def get_stock_data(symbol, historical=False):
     """
     Fetches stock data from Yahoo Finance API
@@ -22,11 +46,11 @@ def get_stock_data(symbol, historical=False):
         
     Returns:
         dict: Stock data including price, name, sector, etc.
+        pd.DataFrame: When historical, daily bars indexed by date (see history_to_frame)
     """
     try:
         # Get stock data from Yahoo Finance
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        info = get_ticker_info(symbol)
         
         if not info or 'regularMarketPrice' not in info:
             logger.error(f"Failed to get data for {symbol}")
@@ -54,21 +78,9 @@ def get_stock_data(symbol, historical=False):
             end_date = datetime.now()
             start_date = end_date - timedelta(days=90)
             
-            hist = stock.history(start=start_date, end=end_date)
+            hist = yf.Ticker(symbol).history(start=start_date, end=end_date)
             
-            # Convert to dictionary format
-            historical_data = {}
-            for index, row in hist.iterrows():
-                date_str = index.strftime('%Y-%m-%d')
-                historical_data[date_str] = {
-                    'open': row['Open'],
-                    'high': row['High'],
-                    'low': row['Low'],
-                    'close': row['Close'],
-                    'volume': row['Volume']
-                }
-            
-            return historical_data
+            return history_to_frame(hist)
             
         return stock_data
         
@@ -76,6 +88,33 @@ def get_stock_data(symbol, historical=False):
         logger.error(f"Error fetching stock data for {symbol}: {e}")
         return None
 
+def history_to_frame(hist):
+    """
+    Convert a yfinance history frame to the StockHistory column layout
+    
+    Args:
+        hist (pd.DataFrame): Output of Ticker.history
+        
+    Returns:
+        pd.DataFrame: open_price, high_price, low_price, close_price and volume
+                      columns on a tz-naive DatetimeIndex named 'date'
+    """
+    frame = hist[['Open', 'High', 'Low', 'Close', 'Volume']].rename(columns={
+        'Open': 'open_price',
+        'High': 'high_price',
+        'Low': 'low_price',
+        'Close': 'close_price',
+        'Volume': 'volume'
+    })
+    
+    # Keep the exchange-local trading day; dropping the timezone preserves wall-clock dates
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    frame.index = index.normalize().rename('date')
+    
+    return frame
+
 def search_stocks(query):
     """
     Search for stocks by name or symbol
@@ -127,8 +166,13 @@ def get_stock_price(symbol):
         dict: Current price data
     """
     try:
-        stock = yf.Ticker(symbol)
-        info = stock.info
+        # A recent batch fetch may already have priced this symbol; on a miss the
+        # Ticker.info lookup below records the call's hit or miss
+        cached = quote_cache.get(f'price:{symbol.upper()}', count_miss=False)
+        if cached:
+            return cached
+        
+        info = get_ticker_info(symbol)
         
         price_data = {
             'symbol': symbol,
@@ -144,6 +188,67 @@ def get_stock_price(symbol):
         logger.error(f"Error fetching stock price for {symbol}: {e}")
         return {'symbol': symbol, 'price': 0, 'error': str(e)}
 
+def get_stock_prices(symbols):
+    """
+    Fetches current prices for many symbols with one multi-ticker download
+    
+    Args:
+        symbols (list): Stock ticker symbols
+        
+    Returns:
+        dict: Symbol -> price data in the same shape as get_stock_price
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols if symbol))
+    prices = {}
+    missing = []
+    
+    for symbol in symbols:
+        cached = quote_cache.get(f'price:{symbol}')
+        if cached:
+            prices[symbol] = cached
+        else:
+            missing.append(symbol)
+    
+    if not missing:
+        return prices
+    
+    try:
+        # A few days of daily bars covers weekends and holidays for the previous close
+        data = yf.download(missing, period='5d', interval='1d', group_by='column',
+                           auto_adjust=False, threads=True, progress=False)
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(missing[0])
+        closes = closes.ffill()
+        
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for symbol in missing:
+            series = closes[symbol].dropna() if symbol in closes else pd.Series(dtype=float)
+            if series.empty:
+                prices[symbol] = {'symbol': symbol, 'price': 0, 'error': 'No price data'}
+                continue
+            
+            price = float(series.iloc[-1])
+            previous = float(series.iloc[-2]) if len(series) > 1 else price
+            change = price - previous
+            
+            price_data = {
+                'symbol': symbol,
+                'price': price,
+                'change': change,
+                'change_percent': (change / previous) * 100 if previous else 0,
+                'time': now
+            }
+            quote_cache.set(f'price:{symbol}', price_data)
+            prices[symbol] = price_data
+    
+    except Exception as e:
+        logger.error(f"Error fetching stock prices for {missing}: {e}")
+        for symbol in missing:
+            prices[symbol] = {'symbol': symbol, 'price': 0, 'error': str(e)}
+    
+    return prices
+
 def get_news_data():
     """
     Fetches financial news from News API
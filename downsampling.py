@@ -0,0 +1,82 @@
+"""
+Server-side downsampling of price series for charts.
+
+Both methods work on NumPy arrays so long ranges reduce to a fixed number of
+points before they are serialised.
+"""
+import numpy as np
+
+def lttb_indices(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets point selection
+
+    Args:
+        x (np.ndarray): Monotonic x values (e.g. day ordinals)
+        y (np.ndarray): Values to preserve the visual shape of
+        points (int): Number of points to keep
+
+    Returns:
+        np.ndarray: Indices of the selected points, ascending
+    """
+    n = len(y)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # First and last points are always kept; the rest is split into equal buckets
+    every = (n - 2) / (points - 2)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        # Average of the next bucket is the third triangle vertex
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+def ohlc_buckets(open_, high, low, close, volume, points):
+    """
+    Aggregate consecutive rows into at most `points` OHLC bars
+
+    Args:
+        open_, high, low, close, volume (np.ndarray): Aligned daily columns
+        points (int): Maximum number of bars
+
+    Returns:
+        tuple: (starts, open, high, low, close, volume) where starts are the
+               index of each bar's first row
+    """
+    n = len(close)
+    if n == 0:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty
+
+    points = max(1, min(points, n))
+    bucket = np.arange(n) * points // n
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    return (
+        starts,
+        np.asarray(open_)[starts],
+        np.maximum.reduceat(np.asarray(high), starts),
+        np.minimum.reduceat(np.asarray(low), starts),
+        np.asarray(close)[ends],
+        np.add.reduceat(np.asarray(volume), starts)
+    )
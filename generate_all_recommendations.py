@@ -0,0 +1,39 @@
+"""
+Script to regenerate recommendations for all users in one batch and schedule nightly runs.
+"""
+import logging
+import time
+import schedule
+from dotenv import load_dotenv
+from app import app
+from recommendation import generate_all_recommendations
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def regenerate_recommendations():
+    with app.app_context():
+        logger.info("Starting batch recommendation generation...")
+        start = time.perf_counter()
+        processed = generate_all_recommendations()
+        logger.info(f"Regenerated recommendations for {processed} users in {time.perf_counter() - start:.1f}s")
+
+
+def schedule_regeneration():
+    # Schedule the regeneration to run nightly at 05:30 AM, after the stock update
+    schedule.every().day.at("05:30").do(regenerate_recommendations)
+    logger.info("Scheduled nightly recommendation generation at 05:30 AM")
+    while True:
+        schedule.run_pending()
+        time.sleep(60)
+
+
+if __name__ == "__main__":
+    # Run an initial regeneration
+    regenerate_recommendations()
+    # Start the scheduler
+    schedule_regeneration()
@@ -0,0 +1,86 @@
+"""
+Bulk ingestion path for StockHistory.
+
+All writers of historical prices go through store_history_frame so that a
+symbol's history lands in one INSERT ... ON CONFLICT DO NOTHING statement
+instead of one existence check and one ORM insert per row.
+"""
+import logging
+
+import pandas as pd
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from models import StockHistory
+
+logger = logging.getLogger(__name__)
+
+HISTORY_COLUMNS = ['date', 'open_price', 'high_price', 'low_price', 'close_price', 'volume']
+
+# Rows per statement; a 20-year daily history fits in a single statement
+BATCH_SIZE = 10000
+
+def store_history_frame(stock_id, hist_df, commit=True):
+    """
+    Insert historical prices for one stock, skipping days that are already stored
+
+    Args:
+        stock_id (int): Stock ID the rows belong to
+        hist_df (pd.DataFrame): Frame with open_price, high_price, low_price, close_price
+                                and volume columns, and dates in a 'date' column or the index
+        commit (bool): Commit the session after inserting
+
+    Returns:
+        int: Number of rows actually inserted
+    """
+    if hist_df is None or hist_df.empty:
+        return 0
+
+    if 'date' not in hist_df.columns:
+        hist_df = hist_df.rename_axis('date').reset_index()
+
+    frame = hist_df[HISTORY_COLUMNS].dropna(subset=['date', 'close_price'])
+    frame = frame.drop_duplicates(subset='date', keep='last')
+    frame = frame.assign(
+        stock_id=stock_id,
+        date=pd.to_datetime(frame['date']).dt.date,
+        open_price=frame['open_price'].astype(float),
+        high_price=frame['high_price'].astype(float),
+        low_price=frame['low_price'].astype(float),
+        close_price=frame['close_price'].astype(float),
+        volume=frame['volume'].fillna(0).astype('int64')
+    )
+    records = frame.to_dict('records')
+
+    inserted = 0
+    for start in range(0, len(records), BATCH_SIZE):
+        stmt = insert(StockHistory).values(records[start:start + BATCH_SIZE])
+        stmt = stmt.on_conflict_do_nothing(index_elements=['stock_id', 'date'])
+        inserted += db.session.execute(stmt).rowcount
+
+    if commit:
+        db.session.commit()
+
+    return inserted
+
+def hydrate_stock_history(stock_id, symbol):
+    """
+    Download recent history for a stock that has none stored and bulk insert it
+
+    Args:
+        stock_id (int): Stock ID
+        symbol (str): Stock ticker symbol
+
+    Returns:
+        bool: True if any history was fetched
+    """
+    from data_fetcher import get_stock_data
+
+    history_df = get_stock_data(symbol, historical=True)
+    if history_df is None or history_df.empty:
+        logger.warning(f"No historical data fetched for {symbol}")
+        return False
+
+    count = store_history_frame(stock_id, history_df)
+    logger.info(f"Hydrated {count} historical data points for {symbol}")
+    return True
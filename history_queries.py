@@ -0,0 +1,108 @@
+"""
+Time-series access helpers for StockHistory.
+
+Every lookup filters on stock_id first and date second so that Postgres can
+answer it from the unique (stock_id, date) index without sorting.
+"""
+import logging
+
+import pandas as pd
+
+from app import db
+from models import Stock, StockHistory
+
+logger = logging.getLogger(__name__)
+
+def _select(columns):
+    """Query either whole StockHistory rows or just the given columns"""
+    if columns:
+        return db.session.query(*columns)
+    return StockHistory.query
+
+def get_history_range(stock_id, start_date=None, end_date=None, columns=None):
+    """
+    Rows for one stock within a date range, oldest first
+
+    Args:
+        stock_id (int): Stock ID
+        start_date (date): First day to include, unbounded if None
+        end_date (date): Last day to include, unbounded if None
+        columns (list): StockHistory columns to select instead of full ORM objects
+
+    Returns:
+        list: StockHistory objects, or column tuples when columns are given
+    """
+    query = _select(columns).filter(StockHistory.stock_id == stock_id)
+    if start_date is not None:
+        query = query.filter(StockHistory.date >= start_date)
+    if end_date is not None:
+        query = query.filter(StockHistory.date <= end_date)
+    return query.order_by(StockHistory.date).all()
+
+def get_history_frame(stock_id, start_date=None, end_date=None):
+    """
+    Rows for one stock within a date range as a columnar frame, without ORM hydration
+
+    Args:
+        stock_id (int): Stock ID
+        start_date (date): First day to include, unbounded if None
+        end_date (date): Last day to include, unbounded if None
+
+    Returns:
+        pd.DataFrame: open_price, high_price, low_price, close_price and volume on a
+                      DatetimeIndex named 'date', oldest first
+    """
+    columns = [StockHistory.date, StockHistory.open_price, StockHistory.high_price,
+               StockHistory.low_price, StockHistory.close_price, StockHistory.volume]
+    rows = get_history_range(stock_id, start_date, end_date, columns=columns)
+    frame = pd.DataFrame(rows, columns=[c.key for c in columns])
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop('date')), name='date')
+    return frame
+
+def get_history_summary(stock_id, start_date=None, end_date=None):
+    """
+    Row count and first/last date for one stock within a date range
+
+    Cheap enough to run before loading a window, e.g. to answer a conditional request.
+
+    Returns:
+        tuple: (count, first date, last date)
+    """
+    query = db.session.query(db.func.count(), db.func.min(StockHistory.date), db.func.max(StockHistory.date)) \
+        .filter(StockHistory.stock_id == stock_id)
+    if start_date is not None:
+        query = query.filter(StockHistory.date >= start_date)
+    if end_date is not None:
+        query = query.filter(StockHistory.date <= end_date)
+    return tuple(query.one())
+
+def as_of_dates_subquery(stock_ids, as_of_date):
+    """
+    Subquery of (stock_id, date) pairs for the latest row on or before a date
+
+    Args:
+        stock_ids (list): Stock IDs
+        as_of_date (date): Cut-off date
+
+    Returns:
+        Query: Selectable usable with tuple_(stock_id, date).in_()
+    """
+    return db.session.query(StockHistory.stock_id, db.func.max(StockHistory.date)) \
+        .filter(StockHistory.stock_id.in_(stock_ids), StockHistory.date <= as_of_date) \
+        .group_by(StockHistory.stock_id)
+
+def get_latest_dates_by_symbol(symbols=None):
+    """
+    The most recent stored date per stock symbol
+
+    Args:
+        symbols (list): Symbols to restrict to, all stocks if None
+
+    Returns:
+        dict: Symbol -> latest date, None for stocks without any history
+    """
+    query = db.session.query(Stock.symbol, db.func.max(StockHistory.date)) \
+        .outerjoin(StockHistory, StockHistory.stock_id == Stock.id)
+    if symbols is not None:
+        query = query.filter(Stock.symbol.in_(symbols))
+    return dict(query.group_by(Stock.symbol).all())
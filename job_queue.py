@@ -0,0 +1,95 @@
+"""
+Background job queue for work that should not block a request.
+
+Jobs run on a small thread pool inside an application context. Submitting a
+job under a key that is already queued or running returns the existing job, so
+duplicate requests for the same work are coalesced. Only in-flight jobs are
+kept; finished ones leave behind just their outcome, for a bounded number of
+recent keys.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+
+logger = logging.getLogger(__name__)
+
+def _outcome(job):
+    """'failed' if a finished job raised or returned False, otherwise 'done'"""
+    if job.cancelled() or job.exception() is not None or job.result() is False:
+        return 'failed'
+    return 'done'
+
+class JobQueue:
+    def __init__(self, max_workers=2, max_recent=1024):
+        """
+        Args:
+            max_workers (int): Jobs run at the same time
+            max_recent (int): Finished jobs whose outcome status() still reports
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs')
+        self.max_recent = max_recent
+        self._jobs = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, key, fn, args, kwargs):
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Job {key} failed: {e}")
+                raise
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Queue fn unless a job with the same key is already pending or running
+
+        Args:
+            key (str): Identity of the job used for coalescing
+            fn (callable): Work to run in an application context
+
+        Returns:
+            Future: The new or already running job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done():
+                return job
+            job = self._executor.submit(self._run, key, fn, args, kwargs)
+            self._jobs[key] = job
+        # Outside the lock: a job that already finished runs the callback right here
+        job.add_done_callback(lambda done: self._finish(key, done))
+        return job
+
+    def _finish(self, key, job):
+        """Drop a finished job, remembering its outcome among the most recent ones"""
+        outcome = _outcome(job)
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+            self._recent[key] = outcome
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.max_recent:
+                self._recent.popitem(last=False)
+
+    def status(self, key):
+        """
+        Current state of the last job submitted under key
+
+        Returns:
+            str: 'pending', 'done', 'failed', or None if never submitted (or
+            finished longer ago than the last max_recent jobs)
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                return self._recent.get(key)
+        if not job.done():
+            return 'pending'
+        return _outcome(job)
+
+# Create a singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,36 @@
+"""Unique (stock_id, date) index on stock_history
+
+Revision ID: a1c3e5f7b9d2
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f7b9d2'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the earliest row of any duplicated (stock_id, date) pair so the unique index can be built
+    op.execute("""
+        DELETE FROM stock_history a
+        USING stock_history b
+        WHERE a.stock_id = b.stock_id
+          AND a.date = b.date
+          AND a.id > b.id
+    """)
+    # Tables created by db.create_all() already carry the index
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_stock_history_stock_id_date
+        ON stock_history (stock_id, date)
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_stock_history_stock_id_date', table_name='stock_history')
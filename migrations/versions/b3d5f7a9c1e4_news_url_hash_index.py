@@ -0,0 +1,63 @@
+"""Unique normalized URL hash on news
+
+Revision ID: b3d5f7a9c1e4
+Revises: e7b1d3f5a9c2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d5f7a9c1e4'
+down_revision = 'e7b1d3f5a9c2'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of news_ingest.url_hash as of this revision
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'cmpid')
+
+
+def url_hash(url):
+    parts = urlsplit((url or '').strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip('/') or '/'
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    op.execute("ALTER TABLE news ADD COLUMN IF NOT EXISTS url_hash VARCHAR(64)")
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, url FROM news WHERE url_hash IS NULL")).fetchall()
+    if rows:
+        conn.execute(
+            sa.text("UPDATE news SET url_hash = :url_hash WHERE id = :id"),
+            [{'id': row.id, 'url_hash': url_hash(row.url)} for row in rows]
+        )
+
+    # Keep the first stored copy of every article fetched more than once
+    op.execute("""
+        DELETE FROM news a
+        USING news b
+        WHERE a.url_hash = b.url_hash
+          AND a.id > b.id
+    """)
+    op.execute("ALTER TABLE news ALTER COLUMN url_hash SET NOT NULL")
+    # Tables created by db.create_all() already carry the indexes
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_news_url_hash ON news (url_hash)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_news_published_at ON news (published_at)")
+
+
+def downgrade():
+    op.drop_index('ix_news_published_at', table_name='news')
+    op.drop_index('ix_news_url_hash', table_name='news')
+    op.drop_column('news', 'url_hash')
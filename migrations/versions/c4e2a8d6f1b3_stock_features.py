@@ -0,0 +1,42 @@
+"""Precomputed stock_features table
+
+Revision ID: c4e2a8d6f1b3
+Revises: a1c3e5f7b9d2
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e2a8d6f1b3'
+down_revision = 'a1c3e5f7b9d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Tables created by db.create_all() when app.py is imported already exist
+    if sa.inspect(op.get_bind()).has_table('stock_features'):
+        return
+
+    op.create_table(
+        'stock_features',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('stock_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.Date(), nullable=False),
+        sa.Column('volatility', sa.Float(), nullable=True),
+        sa.Column('avg_dollar_volume', sa.Float(), nullable=True),
+        sa.Column('momentum', sa.Float(), nullable=True),
+        sa.Column('max_drawdown', sa.Float(), nullable=True),
+        sa.Column('observations', sa.Integer(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['stock_id'], ['stocks.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stock_id')
+    )
+
+
+def downgrade():
+    op.drop_table('stock_features')
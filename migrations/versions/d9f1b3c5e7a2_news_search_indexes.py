@@ -0,0 +1,31 @@
+"""Full-text and related_symbols GIN indexes on news
+
+Revision ID: d9f1b3c5e7a2
+Revises: b3d5f7a9c1e4
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f1b3c5e7a2'
+down_revision = 'b3d5f7a9c1e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Must match models.NEWS_SEARCH_DOCUMENT, which the /api/news query uses verbatim.
+    # Tables created by db.create_all() already carry the indexes
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_news_search
+        ON news USING gin (to_tsvector('english', coalesce(title, '') || ' ' || coalesce(summary, '')))
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_news_related_symbols ON news USING gin (related_symbols)")
+
+
+def downgrade():
+    op.drop_index('ix_news_related_symbols', table_name='news')
+    op.drop_index('ix_news_search', table_name='news')
@@ -0,0 +1,36 @@
+"""Unique (user_id, stock_id) index on recommendations
+
+Revision ID: e7b1d3f5a9c2
+Revises: c4e2a8d6f1b3
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b1d3f5a9c2'
+down_revision = 'c4e2a8d6f1b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the newest row of any duplicated (user_id, stock_id) pair left by delete-and-reinsert races
+    op.execute("""
+        DELETE FROM recommendations a
+        USING recommendations b
+        WHERE a.user_id = b.user_id
+          AND a.stock_id = b.stock_id
+          AND a.id < b.id
+    """)
+    # Tables created by db.create_all() already carry the index
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_recommendations_user_id_stock_id
+        ON recommendations (user_id, stock_id)
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_recommendations_user_id_stock_id', table_name='recommendations')
@@ -2,6 +2,7 @@ from datetime import datetime
 from flask_login import UserMixin
 from app import db
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects.postgresql import array
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -149,6 +150,10 @@ class PortfolioItem(db.Model):
 
 class StockHistory(db.Model):
     __tablename__ = 'stock_history'
+    __table_args__ = (
+        # One row per stock per day; also serves range, as-of and latest-N lookups
+        db.Index('ix_stock_history_stock_id_date', 'stock_id', 'date', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False)
@@ -162,29 +167,69 @@ class StockHistory(db.Model):
     def __repr__(self):
         return f'<StockHistory {self.stock_id} on {self.date}>'
 
+class StockFeatures(db.Model):
+    __tablename__ = 'stock_features'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False, unique=True)
+    as_of = db.Column(db.Date, nullable=False)  # Last trading day the features were computed from
+    volatility = db.Column(db.Float, nullable=True)  # Annualized realized volatility of daily log returns
+    avg_dollar_volume = db.Column(db.Float, nullable=True)  # Mean daily close * volume
+    momentum = db.Column(db.Float, nullable=True)  # Total return over the momentum window
+    max_drawdown = db.Column(db.Float, nullable=True)  # Deepest peak-to-trough decline, <= 0
+    observations = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    stock = db.relationship('Stock', backref=db.backref('features', uselist=False, lazy=True))
+    
+    def __repr__(self):
+        return f'<StockFeatures {self.stock_id} as of {self.as_of}>'
+
+# Full-text document for news search; queries must use this exact expression to hit ix_news_search
+NEWS_SEARCH_DOCUMENT = "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(summary, ''))"
+
 class News(db.Model):
     __tablename__ = 'news'
+    __table_args__ = (
+        # One row per article; the key is a hash of the normalized URL (see news_ingest)
+        db.Index('ix_news_url_hash', 'url_hash', unique=True),
+        db.Index('ix_news_published_at', 'published_at'),
+        # Serve ?q= text search and ?symbol= containment (@>) lookups without scanning
+        db.Index('ix_news_search', db.text(NEWS_SEARCH_DOCUMENT), postgresql_using='gin'),
+        db.Index('ix_news_related_symbols', 'related_symbols', postgresql_using='gin'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     url = db.Column(db.String(500), nullable=False)
+    url_hash = db.Column(db.String(64), nullable=False)
     source = db.Column(db.String(100), nullable=False)
     published_at = db.Column(db.DateTime, nullable=False)
     summary = db.Column(db.Text, nullable=True)
     sentiment_score = db.Column(db.Float, nullable=True)
     related_symbols = db.Column(db.ARRAY(db.String), nullable=True)
     
+    @classmethod
+    def related_to(cls, symbol):
+        """Filter for articles tagged with a symbol; @> can use ix_news_related_symbols, = ANY() cannot"""
+        return cls.related_symbols.op('@>')(db.cast(array([symbol]), cls.related_symbols.type))
+    
     def __repr__(self):
         return f'<News {self.title}>'
 
 class Recommendation(db.Model):
     __tablename__ = 'recommendations'
+    __table_args__ = (
+        # One row per user per stock so rankings can be diffed and upserted in place
+        db.Index('ix_recommendations_user_id_stock_id', 'user_id', 'stock_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=False)
     score = db.Column(db.Float, nullable=False)
-    reason = db.Column(db.Text, nullable=True)
+    reason = db.Column(db.Text, nullable=True)  # Legacy; reasons are now generated at render time
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
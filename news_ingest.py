@@ -0,0 +1,152 @@
+"""
+Bulk ingestion path for News.
+
+Every writer of news articles goes through store_articles so that an article
+is stored once per normalized URL: rows are keyed by a hash of the URL and
+inserted with INSERT ... ON CONFLICT DO NOTHING, and sentiment is only
+computed for articles that are not already stored.
+"""
+import hashlib
+import logging
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from models import News
+from sentiment_analysis import analyze_sentiment_batch
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'cmpid')
+
+# Column sizes from the News model
+MAX_TITLE = 200
+MAX_URL = 500
+MAX_SOURCE = 100
+
+def normalize_url(url):
+    """
+    Canonical form of an article URL
+
+    Lowercases the scheme and host, drops the fragment, tracking parameters and
+    trailing slash, and sorts the remaining query parameters.
+
+    Args:
+        url (str): Article URL
+
+    Returns:
+        str: Normalized URL
+    """
+    parts = urlsplit((url or '').strip())
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+def url_hash(url):
+    """SHA-256 hex digest of the normalized URL, the News deduplication key"""
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+def articles_to_frame(articles, related_symbols=None):
+    """
+    Convert NewsAPI article dicts into News columns
+
+    publishedAt strings are parsed in one vectorized pass; articles without a
+    URL or a parseable publishedAt are dropped and duplicate URLs within the
+    batch keep their first copy.
+
+    Args:
+        articles (list): NewsAPI article dicts
+        related_symbols (list): Symbols to attach to every article
+
+    Returns:
+        pd.DataFrame: One row per distinct article with News column names
+    """
+    if not articles:
+        return pd.DataFrame(columns=['url_hash', 'title', 'url', 'source', 'published_at', 'summary'])
+
+    df = pd.DataFrame({
+        'title': [item.get('title') or '' for item in articles],
+        'url': [item.get('url') or '' for item in articles],
+        'source': [(item.get('source') or {}).get('name') or '' for item in articles],
+        'published_at': [item.get('publishedAt') for item in articles],
+        'summary': [item.get('description') or '' for item in articles]
+    })
+    df = df[df['url'] != '']
+
+    # ISO8601 accepts every form NewsAPI emits (fractional seconds, offsets); without it the
+    # format is inferred from the first row and later rows in another form parse as NaT
+    published_at = pd.to_datetime(df['published_at'], utc=True, errors='coerce', format='ISO8601')
+    unparsed = published_at.isna()
+    if unparsed.any():
+        logger.warning(f"Skipping {int(unparsed.sum())} news articles without a valid publishedAt: "
+                       f"{df.loc[unparsed, 'url'].head(5).tolist()}")
+    df = df[~unparsed].assign(published_at=published_at[~unparsed].dt.tz_localize(None))
+
+    df['title'] = df['title'].str.slice(0, MAX_TITLE)
+    df['url'] = df['url'].str.slice(0, MAX_URL)
+    df['source'] = df['source'].str.slice(0, MAX_SOURCE)
+    df['url_hash'] = df['url'].map(url_hash)
+    df['related_symbols'] = [list(related_symbols or []) for _ in range(len(df))]
+
+    return df.drop_duplicates(subset='url_hash', keep='first')
+
+def store_articles(articles, related_symbols=None, commit=True):
+    """
+    Insert articles that are not stored yet, scoring sentiment only for those
+
+    Args:
+        articles (list): NewsAPI article dicts
+        related_symbols (list): Symbols to attach to every article, including ones already stored
+        commit (bool): Commit the session after inserting
+
+    Returns:
+        int: Number of articles actually inserted
+    """
+    df = articles_to_frame(articles, related_symbols)
+    if df.empty:
+        return 0
+
+    existing = {
+        h for (h,) in db.session.query(News.url_hash).filter(News.url_hash.in_(df['url_hash'].tolist()))
+    }
+    if existing and related_symbols:
+        # Articles first stored by another query still get tagged with these symbols
+        db.session.execute(
+            text("""
+                UPDATE news
+                SET related_symbols = ARRAY(
+                    SELECT DISTINCT unnest(COALESCE(related_symbols, '{}') || CAST(:symbols AS varchar[]))
+                )
+                WHERE url_hash = ANY(:hashes)
+                  AND NOT COALESCE(related_symbols, '{}') @> CAST(:symbols AS varchar[])
+            """),
+            {'symbols': list(related_symbols), 'hashes': list(existing)}
+        )
+    df = df[~df['url_hash'].isin(existing)]
+    if df.empty:
+        if commit:
+            db.session.commit()
+        return 0
+
+    df = df.assign(sentiment_score=analyze_sentiment_batch(df['summary'].tolist()))
+    records = [
+        dict(record, published_at=record['published_at'].to_pydatetime())
+        for record in df.to_dict('records')
+    ]
+
+    # A concurrent writer may have stored some of these since the lookup above
+    stmt = insert(News).values(records).on_conflict_do_nothing(index_elements=['url_hash'])
+    inserted = db.session.execute(stmt).rowcount
+    logger.debug(f"Stored {inserted} of {len(articles)} news articles")
+
+    if commit:
+        db.session.commit()
+
+    return inserted
@@ -0,0 +1,106 @@
+"""
+Background worker that polls NewsAPI for configured queries and tickers and stores scored articles.
+
+/api/news only reads what this worker has stored, so no request waits on NewsAPI or on sentiment scoring.
+"""
+import os
+import logging
+import time
+import schedule
+from dotenv import load_dotenv
+from app import app, db
+from models import Stock, PortfolioItem
+from news_service import news_service
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between polling cycles
+POLL_INTERVAL = int(os.environ.get("NEWS_POLL_INTERVAL", 3600))
+
+# Comma-separated free-text queries, e.g. "stock market,federal reserve"
+NEWS_QUERIES = os.environ.get("NEWS_QUERIES", "stock market")
+
+# Comma-separated ticker symbols; defaults to the most widely held stocks
+NEWS_TICKERS = os.environ.get("NEWS_TICKERS", "")
+
+# Cap on held tickers polled when NEWS_TICKERS is not set, to stay within the daily quota
+MAX_HELD_TICKERS = int(os.environ.get("NEWS_MAX_HELD_TICKERS", 25))
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def get_news_tickers():
+    """
+    Ticker symbols to poll news for
+
+    Returns:
+        list: NEWS_TICKERS if set, otherwise the most widely held stock symbols
+    """
+    tickers = _split(NEWS_TICKERS)
+    if tickers:
+        return [ticker.upper() for ticker in tickers]
+
+    rows = (
+        db.session.query(Stock.symbol)
+        .join(PortfolioItem, PortfolioItem.stock_id == Stock.id)
+        .group_by(Stock.symbol)
+        .order_by(db.func.count(PortfolioItem.id).desc(), Stock.symbol)
+        .limit(MAX_HELD_TICKERS)
+        .all()
+    )
+    return [symbol for (symbol,) in rows]
+
+def poll_news():
+    """
+    Fetch, score and store articles for every configured query and ticker
+
+    Every poll bypasses the news cache and asks NewsAPI for the newest articles, one
+    request per query or ticker from the shared daily quota; polling stops early once
+    that quota is exhausted.
+
+    Returns:
+        int: Number of queries and tickers polled successfully
+    """
+    with app.app_context():
+        try:
+            jobs = [(query, None) for query in _split(NEWS_QUERIES)]
+            jobs += [(ticker, [ticker]) for ticker in get_news_tickers()]
+
+            polled = 0
+            for query, related_symbols in jobs:
+                result, status = news_service.get_news(query, related_symbols=related_symbols, refresh=True)
+                if status == 429:
+                    logger.warning(f"News API quota exhausted after {polled}/{len(jobs)} queries")
+                    break
+                if status != 200:
+                    logger.error(f"Error polling news for '{query}': {result.get('error')}")
+                    db.session.rollback()
+                    continue
+                polled += 1
+
+            logger.info(f"Polled news for {polled}/{len(jobs)} queries and tickers")
+            return polled
+        except Exception as e:
+            logger.error(f"Error polling news: {e}")
+            db.session.rollback()
+            return 0
+
+
+def schedule_polling():
+    schedule.every(POLL_INTERVAL).seconds.do(poll_news)
+    logger.info(f"Scheduled news polling every {POLL_INTERVAL} seconds")
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    # Run an initial poll
+    poll_news()
+    # Start the scheduler
+    schedule_polling()
@@ -1,17 +1,30 @@
 import requests
+import logging
 from datetime import datetime, timedelta
 from flask import current_app
 import os
 from dotenv import load_dotenv
 from collections import defaultdict
-import threading
 from newsapi import NewsApiClient
-from app import db
-from models import News
-from sentiment_analysis import analyze_sentiment
+from cache import TTLCache
+from rate_limiter import SharedBudget
+from sqlalchemy import text
+from models import News, NEWS_SEARCH_DOCUMENT
+from news_ingest import store_articles
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Stale copies of each query outlive the fresh entry so they can be served once the quota is spent
+STALE_CACHE_TTL = 7 * 24 * 60 * 60
+
+class NewsFetchError(Exception):
+    """Upstream news API returned an error; raised inside cache loads so failures are not cached"""
+
+class NewsBudgetExhausted(NewsFetchError):
+    """The shared daily request quota has been used up"""
+
 class NewsService:
     def __init__(self):
         self.newsdata_api_key = os.getenv('NEWSDATA_API_KEY', 'pub_30a53875c8d54bc2bb124a43245a82dd')
@@ -19,100 +32,191 @@ class NewsService:
         self.newsdata_base_url = 'https://newsdata.io/api/1/news'
         self.newsapi_base_url = 'https://newsapi.org/v2'
         self.rate_limit_key = 'news_api_requests'
-        self.max_requests = 200  # NewsData.io daily limit
-        self.cache_expiry = 24 * 60 * 60  # 24 hours in seconds
+        self.max_requests = int(os.getenv('NEWS_API_DAILY_LIMIT', 200))  # Daily request quota
+        self.cache_expiry = int(os.getenv('NEWS_CACHE_TTL', 24 * 60 * 60))  # 24 hours in seconds
         
-        # In-memory cache
-        self._cache = {}
-        self._request_count = 0
-        self._last_reset = datetime.now()
-        self._lock = threading.Lock()
+        # Parsed article lists per normalized query; Redis-backed when REDIS_URL is set
+        self._cache = TTLCache(
+            'news',
+            maxsize=int(os.getenv('NEWS_CACHE_SIZE', 512)),
+            ttl=self.cache_expiry,
+            redis_url=os.getenv('REDIS_URL')
+        )
+        # Daily quota shared by every worker: Redis when configured, otherwise a lock file
+        self.budget = SharedBudget(
+            self.rate_limit_key,
+            self.max_requests,
+            redis_url=os.getenv('REDIS_URL'),
+            path=os.getenv('NEWS_BUDGET_FILE')
+        )
 
         self.newsapi = NewsApiClient(api_key=self.newsapi_key)
 
     def check_rate_limit(self):
-        """Check if we've exceeded the daily rate limit"""
-        with self._lock:
-            # Reset counter if 24 hours have passed
-            if (datetime.now() - self._last_reset).total_seconds() > 24 * 60 * 60:
-                self._request_count = 0
-                self._last_reset = datetime.now()
-            
-            return self._request_count < self.max_requests
+        """Check if any of today's shared request quota is left"""
+        return self.budget.remaining() > 0
 
     def increment_rate_limit(self):
-        """Increment the request counter"""
-        with self._lock:
-            self._request_count += 1
+        """Spend one request from the shared quota, returning False if none is left"""
+        return self.budget.try_consume()
+
+    def rate_limit_status(self):
+        """Remaining daily quota for the status endpoint"""
+        return self.budget.status()
+
+    @staticmethod
+    def normalize_query(query):
+        """Case-fold and collapse whitespace so equivalent queries share a cache entry"""
+        return ' '.join((query or '').lower().split())
+
+    def _date_window(self, from_date=None, until_now=False):
+        """The (from, to) dates a query covers; defaults to the 30 days up to yesterday (or today if until_now)"""
+        end_date = datetime.now() if until_now else datetime.now() - timedelta(days=1)
+        if not from_date:
+            from_date = end_date - timedelta(days=30)
+        return from_date, end_date
 
-    def get_cached_news(self, query):
+    def _cache_key(self, query, from_date, end_date):
+        return f"{self.normalize_query(query)}|{from_date.strftime('%Y-%m-%d')}|{end_date.strftime('%Y-%m-%d')}"
+
+    def get_cached_news(self, query, from_date=None):
         """Get news from cache if available"""
-        cache_key = f'news_cache:{query}'
-        if cache_key in self._cache:
-            cache_data = self._cache[cache_key]
-            # Check if cache is still valid
-            if (datetime.now() - cache_data['timestamp']).total_seconds() < self.cache_expiry:
-                return cache_data['data']
-            else:
-                # Remove expired cache
-                del self._cache[cache_key]
-        return None
+        return self._cache.get(self._cache_key(query, *self._date_window(from_date)))
 
-    def cache_news(self, query, data):
+    def cache_news(self, query, data, from_date=None):
         """Cache news data"""
-        cache_key = f'news_cache:{query}'
-        self._cache[cache_key] = {
-            'data': data,
-            'timestamp': datetime.now()
-        }
+        self._cache.set(self._cache_key(query, *self._date_window(from_date)), data)
+
+    def cache_stats(self):
+        """Hit/miss counters and size of the news cache"""
+        return self._cache.stats()
 
-    def get_news(self, query, from_date=None):
+    def get_news(self, query, from_date=None, related_symbols=None, refresh=False):
         """Get news articles using NewsAPI.org only"""
-        return self.get_newsapi_news(query, from_date)
+        return self.get_newsapi_news(query, from_date, related_symbols, refresh)
+
+    def get_newsapi_news(self, query, from_date=None, related_symbols=None, refresh=False):
+        """
+        Fetch articles for a query from NewsAPI and store them
+
+        Args:
+            query (str): Search query
+            from_date (datetime): Start of the search window (30 days before yesterday if None)
+            related_symbols (list): Symbols to tag the stored articles with
+            refresh (bool): Skip the cache and fetch the newest articles up to now, as the
+                ingester does on every poll; the call still spends the shared quota and is
+                never answered from the stale copy
 
-    def get_newsapi_news(self, query, from_date=None):
-        """Fallback method using NewsAPI"""
+        Returns:
+            tuple: (response dict, HTTP status); the dict's 'inserted' is the number of
+            articles this call stored, 0 when it was answered from the cache
+        """
         if not self.newsapi_key:
             return {'error': 'No fallback API key available'}, 500
 
-        end_date = datetime.now() - timedelta(days=1)
-        if not from_date:
-            from_date = end_date - timedelta(days=30)
+        from_date, end_date = self._date_window(from_date, until_now=refresh)
+        inserted = 0
+
+        cache_key = self._cache_key(query, from_date, end_date)
+        # Last good response for the query regardless of window, served when the quota is spent
+        stale_key = f'stale:{self.normalize_query(query)}'
+
+        def fetch():
+            nonlocal inserted
+            # Every upstream call counts against the quota, successful or not
+            if not self.increment_rate_limit():
+                raise NewsBudgetExhausted('News API daily request quota exhausted')
 
-        try:
             all_articles = self.newsapi.get_everything(
                 q=query,
                 from_param=from_date.strftime('%Y-%m-%d'),
                 to=end_date.strftime('%Y-%m-%d'),
                 language='en',
-                sort_by='popularity'
+                sort_by='publishedAt' if refresh else 'popularity'
             )
+            if all_articles.get('status') != 'ok':
+                raise NewsFetchError('Failed to fetch news')
             
-            if all_articles['status'] == 'ok':
-                self.increment_rate_limit()
-                self.cache_news(query, str(all_articles))
-                print(f"Total Results: {all_articles['totalResults']}")  # Debug print
-                if all_articles['articles']:
-                    print(f"First Article: {all_articles['articles'][0]}")  # Debug print
-                    for item in all_articles['articles']:
-                        news_item = News(
-                            title=item.get('title', ''),
-                            url=item.get('url', ''),
-                            source=item.get('source', {}).get('name', ''),
-                            published_at=item.get('publishedAt', datetime.utcnow()),
-                            summary=item.get('description', ''),
-                            sentiment_score=analyze_sentiment(item.get('description', '')),
-                            related_symbols=[]
-                        )
-                        db.session.add(news_item)
-                    db.session.commit()
-                return all_articles, 200
+            logger.debug(f"Total Results: {all_articles['totalResults']}")
+            if all_articles['articles']:
+                inserted = store_articles(all_articles['articles'], related_symbols)
+            result = {
+                'status': all_articles['status'],
+                'totalResults': all_articles['totalResults'],
+                'articles': all_articles['articles']
+            }
+            self._cache.set(stale_key, result, STALE_CACHE_TTL)
+            return result
+
+        try:
+            if refresh:
+                result = fetch()
+                self._cache.set(cache_key, result)
             else:
-                return {'error': 'Failed to fetch news'}, 500
+                # Concurrent requests for the same query wait for a single upstream call
+                result = self._cache.get_or_load(cache_key, fetch)
+            return dict(result, inserted=inserted), 200
 
+        except NewsBudgetExhausted as e:
+            stale = None if refresh else self._cache.get(stale_key)
+            if stale is not None:
+                return dict(stale, stale=True, inserted=0), 200
+            return {'error': str(e)}, 429
         except Exception as e:
             return {'error': str(e)}, 500
 
+    def get_stored_news(self, query=None, symbol=None, page=1, per_page=20):
+        """
+        Page through stored articles, newest first
+
+        Reads only the news table, which the background ingester (news_ingester.py)
+        keeps filled, so no upstream call is made.
+
+        Args:
+            query (str): Search terms matched against titles and summaries with English full-text search
+            symbol (str): Only articles tagged with this stock symbol
+            page (int): 1-based page number
+            per_page (int): Articles per page
+
+        Returns:
+            dict: Page of articles in NewsAPI's field layout plus paging info
+        """
+        news_query = News.query
+        if query:
+            # Same expression as the ix_news_search GIN index
+            news_query = news_query.filter(
+                text(f"{NEWS_SEARCH_DOCUMENT} @@ websearch_to_tsquery('english', :search)").bindparams(search=query)
+            )
+        if symbol:
+            news_query = news_query.filter(News.related_to(symbol.upper()))
+
+        # One extra row tells us whether another page exists without a COUNT(*)
+        rows = (
+            news_query.order_by(News.published_at.desc(), News.id.desc())
+            .offset((page - 1) * per_page)
+            .limit(per_page + 1)
+            .all()
+        )
+
+        return {
+            'status': 'ok',
+            'page': page,
+            'per_page': per_page,
+            'has_more': len(rows) > per_page,
+            'articles': [
+                {
+                    'title': item.title,
+                    'url': item.url,
+                    'source': {'name': item.source},
+                    'publishedAt': item.published_at.isoformat() + 'Z',
+                    'description': item.summary,
+                    'sentimentScore': item.sentiment_score,
+                    'relatedSymbols': item.related_symbols or []
+                }
+                for item in rows[:per_page]
+            ]
+        }
+
     def extract_stock_symbols(self, text):
         """Extract stock symbols from text"""
         # Basic implementation - can be enhanced with more sophisticated pattern matching
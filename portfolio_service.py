@@ -0,0 +1,177 @@
+"""
+Read layer for portfolios and recommendations.
+
+Loads a portfolio together with all of its stock, real-estate and crypto
+holdings in a constant number of queries so views do not issue one lookup
+per item.
+"""
+import logging
+from sqlalchemy.orm import configure_mappers, joinedload, selectinload
+
+from app import db
+from models import Portfolio, PortfolioItem, Recommendation, Stock
+
+logger = logging.getLogger(__name__)
+
+# Backref attributes such as PortfolioItem.stock only exist once mappers are configured
+configure_mappers()
+
+def _portfolio_options():
+    """Eager-loading options for a portfolio and every holding type"""
+    return selectinload(Portfolio.items).options(
+        joinedload(PortfolioItem.stock),
+        joinedload(PortfolioItem.real_estate),
+        joinedload(PortfolioItem.cryptocurrency)
+    )
+
+def get_user_portfolio(user_id, create=False):
+    """
+    Load a user's portfolio with all holdings in two queries
+
+    Args:
+        user_id (int): Owner of the portfolio
+        create (bool): Create the default portfolio if the user has none
+
+    Returns:
+        Portfolio: Portfolio with items and their investments loaded, or None
+    """
+    portfolio = Portfolio.query.options(_portfolio_options()).filter_by(user_id=user_id).first()
+
+    if not portfolio and create:
+        portfolio = Portfolio(user_id=user_id, name="Default Portfolio", description="My main investment portfolio")
+        db.session.add(portfolio)
+        db.session.commit()
+
+    return portfolio
+
+def get_portfolio_item(item_id):
+    """
+    Load a single portfolio item with its portfolio and investment in one query
+
+    Args:
+        item_id (int): Portfolio item ID
+
+    Returns:
+        PortfolioItem: Item or None if not found
+    """
+    return PortfolioItem.query.options(
+        joinedload(PortfolioItem.portfolio),
+        joinedload(PortfolioItem.stock),
+        joinedload(PortfolioItem.real_estate),
+        joinedload(PortfolioItem.cryptocurrency)
+    ).filter_by(id=item_id).first()
+
+def get_user_recommendations(user_id, limit=None):
+    """
+    Load a user's stored recommendations with their stocks and stock features in one query
+
+    Args:
+        user_id (int): User ID
+        limit (int): Maximum number of recommendations, highest score first
+
+    Returns:
+        list: Recommendation objects with stock and stock.features loaded
+    """
+    query = Recommendation.query.options(joinedload(Recommendation.stock).joinedload(Stock.features)) \
+        .filter_by(user_id=user_id) \
+        .order_by(Recommendation.score.desc())
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+def summarize_portfolio(portfolio):
+    """
+    Value every holding in a loaded portfolio
+
+    Args:
+        portfolio (Portfolio): Portfolio loaded via get_user_portfolio
+
+    Returns:
+        dict: Holdings as display dicts plus total value and total investment
+    """
+    portfolio_data = []
+    total_value = 0
+    total_investment = 0
+
+    for item in (portfolio.items if portfolio else []):
+        if item.investment_type == 'stock':
+            investment = item.stock
+            if investment:
+                current_value = investment.current_price * item.quantity
+                initial_value = item.purchase_price * item.quantity
+                profit_loss = current_value - initial_value
+                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
+
+                portfolio_data.append({
+                    'id': item.id,
+                    'type': 'stock',
+                    'symbol': investment.symbol,
+                    'name': investment.name,
+                    'sector': investment.sector,
+                    'quantity': item.quantity,
+                    'purchase_price': item.purchase_price,
+                    'current_price': investment.current_price,
+                    'current_value': current_value,
+                    'profit_loss': profit_loss,
+                    'profit_loss_percent': profit_loss_percent,
+                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
+                })
+
+                total_value += current_value
+                total_investment += initial_value
+
+        elif item.investment_type == 'real_estate':
+            investment = item.real_estate
+            if investment:
+                current_value = investment.current_value
+                initial_value = item.purchase_price
+                profit_loss = current_value - initial_value
+                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
+
+                portfolio_data.append({
+                    'id': item.id,
+                    'type': 'real_estate',
+                    'name': investment.name,
+                    'location': investment.location,
+                    'property_type': investment.property_type,
+                    'quantity': 1,  # Real estate is typically one unit
+                    'purchase_price': item.purchase_price,
+                    'current_value': current_value,
+                    'profit_loss': profit_loss,
+                    'profit_loss_percent': profit_loss_percent,
+                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
+                })
+
+                total_value += current_value
+                total_investment += initial_value
+
+        elif item.investment_type == 'cryptocurrency':
+            investment = item.cryptocurrency
+            if investment:
+                current_value = investment.current_price * item.quantity
+                initial_value = item.purchase_price * item.quantity
+                profit_loss = current_value - initial_value
+                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
+
+                portfolio_data.append({
+                    'id': item.id,
+                    'type': 'cryptocurrency',
+                    'symbol': investment.symbol,
+                    'name': investment.name,
+                    'quantity': item.quantity,
+                    'purchase_price': item.purchase_price,
+                    'current_price': investment.current_price,
+                    'current_value': current_value,
+                    'profit_loss': profit_loss,
+                    'profit_loss_percent': profit_loss_percent,
+                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
+                })
+
+                total_value += current_value
+                total_investment += initial_value
+
+    return {
+        'items': portfolio_data,
+        'total_value': total_value,
+        'total_investment': total_investment
+    }
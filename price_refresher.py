@@ -0,0 +1,103 @@
+"""
+Background worker that keeps Stock.current_price warm for held and watched stocks.
+"""
+import os
+import logging
+import time
+from datetime import datetime
+import schedule
+from dotenv import load_dotenv
+from sqlalchemy import Float, Integer, column, update, values
+from app import app, db
+from models import Stock, PortfolioItem, Recommendation
+from data_fetcher import get_stock_prices
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between refresh cycles
+REFRESH_INTERVAL = int(os.environ.get("PRICE_REFRESH_INTERVAL", 300))
+
+# Symbols per multi-ticker download
+BATCH_SIZE = 200
+
+def get_tracked_stocks():
+    """
+    Stocks that are held in any portfolio or recommended to any user
+    
+    Symbols are stored as typed (e.g. a stock added from /stock/aapl), while
+    quotes come back upper-cased, so stocks are keyed by the upper-cased symbol.
+    
+    Returns:
+        dict: Upper-cased symbol -> list of stock IDs stored under it in any case
+    """
+    held = db.session.query(PortfolioItem.stock_id).filter(PortfolioItem.stock_id.isnot(None))
+    watched = db.session.query(Recommendation.stock_id)
+    tracked = {}
+    for symbol, stock_id in db.session.query(Stock.symbol, Stock.id).filter(Stock.id.in_(held.union(watched))):
+        tracked.setdefault(symbol.upper(), []).append(stock_id)
+    return tracked
+
+def refresh_prices():
+    """
+    Fetch quotes for all tracked stocks and write them with one bulk UPDATE
+    
+    Returns:
+        int: Number of stocks updated
+    """
+    with app.app_context():
+        try:
+            tracked = get_tracked_stocks()
+            if not tracked:
+                return 0
+            
+            symbols = list(tracked)
+            prices = {}
+            for start in range(0, len(symbols), BATCH_SIZE):
+                prices.update(get_stock_prices(symbols[start:start + BATCH_SIZE]))
+            
+            rows = [
+                (stock_id, float(quote['price']))
+                for symbol, quote in prices.items()
+                if not quote.get('error') and quote.get('price')
+                for stock_id in tracked.get(symbol.upper(), [])
+            ]
+            if not rows:
+                logger.warning("No prices fetched in this refresh cycle")
+                return 0
+            
+            # UPDATE stocks ... FROM (VALUES ...) in a single statement
+            new_prices = values(column('id', Integer), column('price', Float), name='new_prices').data(rows)
+            db.session.execute(
+                update(Stock)
+                .where(Stock.id == new_prices.c.id)
+                .values(current_price=new_prices.c.price, price_updated_at=datetime.utcnow())
+            )
+            db.session.commit()
+            
+            tracked_count = sum(len(stock_ids) for stock_ids in tracked.values())
+            logger.info(f"Refreshed prices for {len(rows)}/{tracked_count} tracked stocks")
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error refreshing prices: {e}")
+            db.session.rollback()
+            return 0
+
+
+def schedule_refresh():
+    schedule.every(REFRESH_INTERVAL).seconds.do(refresh_prices)
+    logger.info(f"Scheduled price refresh every {REFRESH_INTERVAL} seconds")
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
+
+
+if __name__ == "__main__":
+    # Run an initial refresh
+    refresh_prices()
+    # Start the scheduler
+    schedule_refresh()
@@ -0,0 +1,364 @@
+"""
+Process-level price matrix for all stocks.
+
+Holds StockHistory as contiguous NumPy arrays: a shared trading-day calendar,
+a stock ID -> column index, a days x stocks close matrix and a matching volume
+matrix. The store can be saved as a directory of .npy files and reopened with
+mmap so every gunicorn worker shares the same pages instead of holding a copy.
+
+Build or refresh the snapshot with:
+
+    python price_store.py build
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import func
+
+logger = logging.getLogger(__name__)
+
+# Snapshot directory shared by workers; the store is only used when this is set
+PRICE_STORE_PATH = os.environ.get('PRICE_STORE_PATH')
+
+# Seconds between checks for a newer snapshot on disk
+RELOAD_CHECK_INTERVAL = 60
+
+# Times open() starts over when a concurrent save() removes the snapshot it was reading
+OPEN_ATTEMPTS = 3
+
+class PriceStore:
+    def __init__(self, dtype=np.float64):
+        self.dtype = dtype
+        self.calendar = np.empty(0, dtype='datetime64[D]')
+        self.stock_ids = np.empty(0, dtype=np.int64)
+        self.closes = np.empty((0, 0), dtype=dtype)
+        self.volumes = np.empty((0, 0), dtype=np.int64)
+        self._column = {}
+
+    @property
+    def loaded(self):
+        return self.calendar.size > 0
+
+    def _index_columns(self):
+        self._column = {stock_id: col for col, stock_id in enumerate(self.stock_ids.tolist())}
+
+    def _fetch_rows(self, after=None, stock_ids=None):
+        """Column-only StockHistory rows as NumPy arrays, optionally only after a date or for some stocks"""
+        from app import db
+        from models import StockHistory
+
+        query = db.session.query(StockHistory.stock_id, StockHistory.date, StockHistory.close_price, StockHistory.volume)
+        if after is not None:
+            query = query.filter(StockHistory.date > after)
+        if stock_ids is not None:
+            query = query.filter(StockHistory.stock_id.in_(stock_ids))
+        rows = query.all()
+        if not rows:
+            return None
+        stock_ids, dates, closes, volumes = zip(*rows)
+        return (
+            np.asarray(stock_ids, dtype=np.int64),
+            np.asarray(dates, dtype='datetime64[D]'),
+            np.asarray(closes, dtype=self.dtype),
+            np.asarray(volumes, dtype=np.int64)
+        )
+
+    def _scatter(self, stock_ids, dates, closes, volumes, calendar, all_stock_ids,
+                 base_closes=None, base_volumes=None, base_rows=None, cleared_cols=None):
+        """
+        Place rows into days x stocks matrices laid out by calendar and all_stock_ids
+
+        Args:
+            base_closes, base_volumes: Existing matrices to start from; their columns are the
+                                       leading entries of all_stock_ids
+            base_rows (np.ndarray): Row in calendar of each base row, leading rows if None
+            cleared_cols (np.ndarray): Base columns to blank before placing rows, for reloaded stocks
+        """
+        n_days, n_stocks = len(calendar), len(all_stock_ids)
+        new_closes = np.full((n_days, n_stocks), np.nan, dtype=self.dtype)
+        new_volumes = np.zeros((n_days, n_stocks), dtype=np.int64)
+        if base_closes is not None:
+            if base_rows is None:
+                base_rows = np.arange(base_closes.shape[0])
+            new_closes[base_rows, :base_closes.shape[1]] = base_closes
+            new_volumes[base_rows, :base_volumes.shape[1]] = base_volumes
+            if cleared_cols is not None and len(cleared_cols):
+                new_closes[:, cleared_cols] = np.nan
+                new_volumes[:, cleared_cols] = 0
+
+        order = np.argsort(all_stock_ids)
+        cols = order[np.searchsorted(all_stock_ids, stock_ids, sorter=order)]
+        rows = np.searchsorted(calendar, dates)
+        new_closes[rows, cols] = closes
+        new_volumes[rows, cols] = volumes
+        return new_closes, new_volumes
+
+    def load_from_db(self, since=None):
+        """
+        Load StockHistory in one column-only query
+
+        Args:
+            since (date): Only load days after this date, everything if None
+        """
+        fetched = self._fetch_rows(after=since)
+        if fetched is None:
+            self.__init__(self.dtype)
+            return
+        stock_ids, dates, closes, volumes = fetched
+
+        self.calendar = np.unique(dates)
+        self.stock_ids = np.unique(stock_ids)
+        self.closes, self.volumes = self._scatter(stock_ids, dates, closes, volumes, self.calendar, self.stock_ids)
+        self._index_columns()
+        logger.info(f"Price store loaded {self.closes.shape[0]} days x {self.closes.shape[1]} stocks")
+
+    def _changed_stocks(self):
+        """
+        Stocks whose stored history up to the last calendar day no longer matches the store
+
+        Catches history that arrived after the store was built for days it already
+        covers: a stock hydrated or backfilled later, or gaps filled in. Corrections
+        to closes already in the store are not detected.
+
+        Returns:
+            list: Stock IDs to reload in full
+        """
+        from app import db
+        from models import StockHistory
+
+        summary = (
+            db.session.query(StockHistory.stock_id, func.min(StockHistory.date), func.count(StockHistory.id))
+            .filter(StockHistory.date <= self.calendar[-1].item())
+            .group_by(StockHistory.stock_id)
+            .all()
+        )
+        observed = ~np.isnan(np.asarray(self.closes))
+        counts = observed.sum(axis=0)
+        first_days = self.calendar[observed.argmax(axis=0)]
+
+        changed = []
+        for stock_id, first_day, count in summary:
+            col = self._column.get(stock_id)
+            if col is None or count != counts[col] or np.datetime64(first_day, 'D') != first_days[col]:
+                changed.append(stock_id)
+        return changed
+
+    def update_from_db(self):
+        """
+        Append days newer than the last calendar day and reload stocks whose earlier history changed
+
+        Returns:
+            int: Number of days added to the calendar
+        """
+        if not self.loaded:
+            self.load_from_db()
+            return len(self.calendar)
+
+        changed = self._changed_stocks()
+        parts = [self._fetch_rows(after=self.calendar[-1].item())]
+        if changed:
+            parts.append(self._fetch_rows(stock_ids=changed))
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return 0
+        stock_ids, dates, closes, volumes = (np.concatenate(arrays) for arrays in zip(*parts))
+
+        calendar = np.union1d(self.calendar, dates)
+        new_stocks = np.setdiff1d(np.unique(stock_ids), self.stock_ids)
+        all_stock_ids = np.concatenate([self.stock_ids, new_stocks])
+        cleared_cols = np.array([self._column[stock_id] for stock_id in changed if stock_id in self._column], dtype=np.int64)
+
+        added = len(calendar) - len(self.calendar)
+        self.closes, self.volumes = self._scatter(
+            stock_ids, dates, closes, volumes, calendar, all_stock_ids,
+            base_closes=self.closes, base_volumes=self.volumes,
+            base_rows=np.searchsorted(calendar, self.calendar), cleared_cols=cleared_cols
+        )
+        self.calendar = calendar
+        self.stock_ids = all_stock_ids
+        self._index_columns()
+        logger.info(f"Price store added {added} days and reloaded {len(changed)} stocks with changed history")
+        return added
+
+    def save(self, path):
+        """Write the store as .npy files into a directory, replacing any previous snapshot"""
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        os.makedirs(tmp_path, exist_ok=True)
+        np.save(os.path.join(tmp_path, 'calendar.npy'), self.calendar)
+        np.save(os.path.join(tmp_path, 'stock_ids.npy'), self.stock_ids)
+        np.save(os.path.join(tmp_path, 'closes.npy'), np.ascontiguousarray(self.closes))
+        np.save(os.path.join(tmp_path, 'volumes.npy'), np.ascontiguousarray(self.volumes))
+
+        # Swap directories; workers with the old files mapped keep reading them until they reload,
+        # and open() reads through one directory handle so it never mixes the two snapshots
+        old_path = f'{path}.old-{os.getpid()}'
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @staticmethod
+    def _load_array(dir_fd, name, mmap):
+        """Load one .npy file from an open snapshot directory, memory-mapped read-only if mmap"""
+        with os.fdopen(os.open(name, os.O_RDONLY, dir_fd=dir_fd), 'rb') as f:
+            if not mmap:
+                return np.load(f)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            # The mapping outlives the file handle and the snapshot being swapped out
+            return np.memmap(f, dtype=dtype, mode='r', shape=shape, offset=f.tell(),
+                             order='F' if fortran_order else 'C')
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        """
+        Open a saved snapshot
+
+        Every file is opened relative to one handle on the directory, so a save()
+        swapping in a new snapshot meanwhile cannot mix files from the two. If the
+        swap deletes the directory before all files are open, the new snapshot is
+        opened instead.
+
+        Args:
+            path (str): Snapshot directory
+            mmap (bool): Map the matrices read-only instead of reading them into memory
+
+        Returns:
+            PriceStore: Store backed by the snapshot
+        """
+        store = cls()
+        for attempt in range(OPEN_ATTEMPTS):
+            dir_fd = os.open(path, os.O_RDONLY)
+            try:
+                store.calendar = cls._load_array(dir_fd, 'calendar.npy', mmap=False)
+                store.stock_ids = cls._load_array(dir_fd, 'stock_ids.npy', mmap=False)
+                store.closes = cls._load_array(dir_fd, 'closes.npy', mmap=mmap)
+                store.volumes = cls._load_array(dir_fd, 'volumes.npy', mmap=mmap)
+                break
+            except FileNotFoundError:
+                if attempt == OPEN_ATTEMPTS - 1:
+                    raise
+            finally:
+                os.close(dir_fd)
+        store.dtype = store.closes.dtype
+        store._index_columns()
+        return store
+
+    def has_stocks(self, stock_ids):
+        return all(stock_id in self._column for stock_id in stock_ids)
+
+    def columns_for(self, stock_ids):
+        """Column indices for stock IDs; raises KeyError for unknown stocks"""
+        return np.array([self._column[stock_id] for stock_id in stock_ids], dtype=np.int64)
+
+    def window(self, stock_ids, start=None, end=None):
+        """
+        Close and volume sub-matrices for a date range
+
+        Returns:
+            tuple: (calendar slice, closes days x stocks, volumes days x stocks)
+        """
+        cols = self.columns_for(stock_ids)
+        lo = 0 if start is None else np.searchsorted(self.calendar, np.datetime64(start, 'D'))
+        hi = len(self.calendar) if end is None else np.searchsorted(self.calendar, np.datetime64(end, 'D'), side='right')
+        return self.calendar[lo:hi], self.closes[lo:hi][:, cols], self.volumes[lo:hi][:, cols]
+
+    def closes_as_of(self, stock_ids, dates):
+        """
+        Latest close on or before each date for each stock
+
+        Args:
+            stock_ids (list): Stock IDs
+            dates (array-like): Dates to sample, ascending
+
+        Returns:
+            np.ndarray: len(dates) x len(stock_ids) closes, NaN where no close exists yet
+        """
+        cols = self.columns_for(stock_ids)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        rows = np.searchsorted(self.calendar, dates, side='right') - 1
+
+        last = max(int(rows.max()), 0) if rows.size else 0
+        sub = np.asarray(self.closes[:last + 1][:, cols], dtype=np.float64)
+
+        # Forward fill: index of the last valid row at or above each row
+        valid = ~np.isnan(sub)
+        filled_rows = np.maximum.accumulate(np.where(valid, np.arange(sub.shape[0])[:, None], 0), axis=0)
+        filled = np.take_along_axis(sub, filled_rows, axis=0)
+
+        result = filled[np.clip(rows, 0, None)]
+        result[rows < 0] = np.nan
+        return result
+
+_shared_store = None
+_shared_mtime = None
+_last_check = 0.0
+_shared_lock = threading.Lock()
+
+def get_price_store():
+    """
+    The snapshot at PRICE_STORE_PATH, mmapped once per process and reopened when rebuilt
+
+    Returns:
+        PriceStore: Shared store, or None when no snapshot is configured or present
+    """
+    global _shared_store, _shared_mtime, _last_check
+
+    if not PRICE_STORE_PATH:
+        return None
+
+    now = time.monotonic()
+    if _shared_store is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _shared_store
+
+    with _shared_lock:
+        _last_check = now
+        try:
+            mtime = os.stat(PRICE_STORE_PATH).st_mtime
+        except OSError:
+            return _shared_store
+        if _shared_store is None or mtime != _shared_mtime:
+            try:
+                _shared_store = PriceStore.open(PRICE_STORE_PATH)
+                _shared_mtime = mtime
+            except Exception as e:
+                logger.error(f"Error opening price store snapshot: {e}")
+        return _shared_store
+
+def build_snapshot(path=PRICE_STORE_PATH, incremental=True):
+    """
+    Build or extend the on-disk snapshot from StockHistory
+
+    Args:
+        path (str): Snapshot directory
+        incremental (bool): Update an existing snapshot with new days and changed stocks instead of reloading everything
+
+    Returns:
+        PriceStore: The store that was saved
+    """
+    from app import app
+
+    with app.app_context():
+        if incremental and path and os.path.exists(path):
+            store = PriceStore.open(path, mmap=False)
+            store.update_from_db()
+        else:
+            store = PriceStore()
+            store.load_from_db()
+        store.save(path)
+        return store
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'rebuild') or not PRICE_STORE_PATH:
+        print("Usage: PRICE_STORE_PATH=<dir> python price_store.py build|rebuild")
+        sys.exit(1)
+    build_snapshot(incremental=sys.argv[1] == 'build')
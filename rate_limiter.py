@@ -0,0 +1,178 @@
+"""
+Rate limiting for upstream API budgets.
+
+SharedBudget enforces a hard quota per fixed window (a minute, a day) across
+every worker process; callers either fail fast or wait for the next window.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, budgets fall back to per-process counts
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _LocalBudgetStore:
+    """Per-process counter, used when no shared store is available"""
+
+    name = 'local'
+
+    def __init__(self):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def consume(self, window, amount, limit):
+        with self._lock:
+            used = self._windows.get(window, 0)
+            if used + amount > limit:
+                return False, used
+            self._windows = {window: used + amount}
+            return True, used + amount
+
+class _FileBudgetStore:
+    """Counter in a small JSON file guarded by flock, shared by every process on the host"""
+
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+
+    def consume(self, window, amount, limit):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else {}
+                used = state.get('used', 0) if state.get('window') == window else 0
+                if used + amount > limit:
+                    return False, used
+                if amount:
+                    f.seek(0)
+                    f.truncate()
+                    json.dump({'window': window, 'used': used + amount}, f)
+                    f.flush()
+                return True, used + amount
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+class _RedisBudgetStore:
+    """Counter in Redis, shared by every process using the same server"""
+
+    name = 'redis'
+
+    def __init__(self, client, namespace, period):
+        self._client = client
+        self._namespace = namespace
+        self._period = period
+
+    def consume(self, window, amount, limit):
+        key = f'{self._namespace}:{window}'
+        if not amount:
+            return True, int(self._client.get(key) or 0)
+        used = self._client.incrby(key, amount)
+        if used == amount:
+            self._client.expire(key, int(self._period * 2))
+        if used > limit:
+            self._client.decrby(key, amount)
+            return False, used - amount
+        return True, used
+
+class SharedBudget:
+    """
+    A quota of `limit` calls per fixed `period` window, enforced across processes.
+
+    Counts live in Redis when a URL is given, otherwise in an flock-guarded file
+    so every gunicorn worker on the host draws from the same budget. If the
+    shared store fails, calls are counted per process instead of failing.
+    """
+
+    def __init__(self, name, limit, period=86400, redis_url=None, path=None):
+        """
+        Args:
+            name (str): Budget name, used in Redis keys and the default file name
+            limit (int): Calls allowed per window
+            period (int): Window length in seconds; daily windows start at UTC midnight
+            redis_url (str): Optional Redis URL for the shared counter
+            path (str): Counter file when Redis is not used
+        """
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self._local = _LocalBudgetStore()
+        self._store = None
+
+        if redis_url:
+            try:
+                import redis
+                client = redis.Redis.from_url(redis_url, socket_timeout=1)
+                client.ping()
+                self._store = _RedisBudgetStore(client, f'budget:{name}', period)
+            except Exception as e:
+                logger.warning(f"Budget '{name}' cannot use Redis, trying a lock file: {e}")
+
+        if self._store is None and fcntl is not None:
+            self._store = _FileBudgetStore(path or os.path.join(tempfile.gettempdir(), f'{name}_budget.json'))
+
+        if self._store is None:
+            self._store = self._local
+
+    def _window(self, now=None):
+        return int((time.time() if now is None else now) // self.period)
+
+    def _consume(self, amount):
+        window = self._window()
+        try:
+            return self._store.consume(window, amount, self.limit)
+        except Exception as e:
+            logger.warning(f"Budget '{self.name}' shared store failed, counting in process: {e}")
+            return self._local.consume(window, amount, self.limit)
+
+    def try_consume(self, amount=1):
+        """
+        Spend calls from the current window if enough remain
+
+        Returns:
+            bool: True if the calls were granted
+        """
+        allowed, _ = self._consume(amount)
+        return allowed
+
+    def acquire(self, amount=1):
+        """
+        Spend calls, sleeping until the next window whenever the current one is used up
+
+        Every process waits on the same counter, so together they never exceed
+        the limit in any window.
+        """
+        while not self.try_consume(amount):
+            time.sleep(self.seconds_until_reset())
+
+    def seconds_until_reset(self):
+        """Seconds until the next window opens"""
+        now = time.time()
+        return (self._window(now) + 1) * self.period - now
+
+    def remaining(self):
+        """Calls left in the current window"""
+        _, used = self._consume(0)
+        return max(0, self.limit - used)
+
+    def status(self):
+        """Budget usage for status endpoints"""
+        remaining = self.remaining()
+        reset_at = datetime.fromtimestamp((self._window() + 1) * self.period, tz=timezone.utc)
+        return {
+            'limit': self.limit,
+            'used': self.limit - remaining,
+            'remaining': remaining,
+            'reset_at': reset_at.isoformat(),
+            'backend': self._store.name
+        }
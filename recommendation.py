@@ -1,15 +1,47 @@
+import os
+import hashlib
 import logging
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
 from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert
 
 from app import db
+from cache import TTLCache
 from models import User, UserPreference, Stock, Portfolio, PortfolioItem, Recommendation, StockHistory
+from recommendation_engine import recommendation_engine
+from recommendation_diff import diff_rankings
+from history_queries import as_of_dates_subquery
+from price_store import get_price_store
 
 logger = logging.getLogger(__name__)
 
+# Ranked lists shared by users with identical preference vectors. Kept in process
+# because keys carry the engine version, which is local to each worker.
+recommendation_cache = TTLCache(
+    'recommendations',
+    maxsize=int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 4096)),
+    ttl=int(os.environ.get("RECOMMENDATION_CACHE_TTL", 3600))
+)
+
+# Ranks cached beyond top_n so a user's holdings can be filtered out of a shared list
+CACHE_DEPTH_MARGIN = 20
+
+def preference_key(user_vector, depth):
+    """
+    Cache key for a ranked list: preference vector hash plus stock-universe version
+    
+    Args:
+        user_vector (list): User preference vector aligned with the engine columns
+        depth (int): Number of ranks in the list
+    
+    Returns:
+        str: Key that changes whenever the engine's feature matrix is rebuilt or updated
+    """
+    digest = hashlib.sha1(np.asarray(user_vector, dtype=np.float64).tobytes()).hexdigest()
+    return f'{recommendation_engine.version}:{depth}:{digest}'
+
 def generate_recommendations(user_id):
     """
     Generate stock recommendations for a user based on their preferences and portfolio
@@ -28,134 +60,163 @@ def generate_recommendations(user_id):
             logger.error(f"No preferences found for user {user_id}")
             return False
         
-        # Get user's current portfolio
-        portfolio = Portfolio.query.filter_by(user_id=user_id).first()
-        
-        if portfolio:
-            portfolio_items = PortfolioItem.query.filter_by(portfolio_id=portfolio.id).all()
-            portfolio_stocks = [item.stock_id for item in portfolio_items]
-        else:
-            portfolio_stocks = []
-        
-        # Get all stocks from the database
-        all_stocks = Stock.query.all()
+        top_recommendations = recommend_for_user(user_prefs)
         
-        if not all_stocks:
-            logger.error("No stocks found in database")
+        if not top_recommendations:
+            logger.error("No valid stock data for recommendations")
             return False
         
-        # Prepare data for recommendation algorithm
-        stocks_data = []
-        
-        for stock in all_stocks:
-            # Skip stocks already in portfolio
-            if stock.id in portfolio_stocks:
-                continue
-            
-                # Use fixed volatility based on sector for testing
-            # In production, this would use actual historical data
-            sector_volatility = {
-                'Technology': 0.3,
-                'Healthcare': 0.2,
-                'Financial Services': 0.25,
-                'Consumer Goods': 0.15,
-                'Energy': 0.35,
-                'Utilities': 0.1,
-                'Industrials': 0.2,
-                'Materials': 0.25,
-                'Real Estate': 0.2,
-                'Telecommunications': 0.15,
-                'Automotive': 0.4,
-                'Entertainment': 0.3,
-                'Retail': 0.25
-            }
+        # Write only what changed since the stored ranking; reasons are derived when rendered
+        save_recommendations({user_id: [(rec['id'], rec['score']) for rec in top_recommendations]})
+        return True
+    
+    except Exception as e:
+        logger.error(f"Error generating recommendations: {e}")
+        db.session.rollback()
+        return False
+
+def save_recommendations(rankings):
+    """
+    Bring stored recommendations in line with new rankings, writing only the differences
+    
+    Rows for stocks that dropped out are deleted in one statement; new stocks
+    and stocks whose score moved go through a single INSERT ... ON CONFLICT
+    (user_id, stock_id) DO UPDATE, which keeps an existing row's created_at.
+    Stocks that stayed with the same score are not written, and nothing is
+    written or committed when the stored rankings already match.
+    
+    Args:
+        rankings (dict): User ID -> list of (stock_id, score) for the new top-k
+    
+    Returns:
+        dict: Number of rows inserted, updated and deleted
+    """
+    if not rankings:
+        return {'inserted': 0, 'updated': 0, 'deleted': 0}
+    
+    stored = {}
+    for rec_id, user_id, stock_id, score in db.session.query(
+        Recommendation.id, Recommendation.user_id, Recommendation.stock_id, Recommendation.score
+    ).filter(Recommendation.user_id.in_(list(rankings))):
+        stored.setdefault(user_id, {})[stock_id] = (rec_id, score)
+    
+    upserts, deletes, counts = diff_rankings(stored, rankings)
+    if not (upserts or deletes):
+        return counts
+    
+    if deletes:
+        db.session.execute(db.delete(Recommendation).where(Recommendation.id.in_(deletes)))
+    if upserts:
+        now = datetime.utcnow()
+        stmt = insert(Recommendation).values([dict(row, created_at=now) for row in upserts])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'stock_id'],
+            set_={'score': stmt.excluded.score}
+        )
+        db.session.execute(stmt)
+    db.session.commit()
+    
+    return counts
+
+def recommend_for_user(user_prefs, top_n=20):
+    """
+    Rank stocks for a user against the precomputed feature matrix without touching the database
+    
+    Args:
+        user_prefs (UserPreference): User preference object
+        top_n (int): Maximum number of recommendations
+    
+    Returns:
+        list: Stock feature dicts with a 'score' key, best first
+    """
+    # Get user's current portfolio
+    portfolio_stocks = {
+        stock_id for (stock_id,) in db.session.query(PortfolioItem.stock_id)
+        .join(Portfolio, PortfolioItem.portfolio_id == Portfolio.id)
+        .filter(Portfolio.user_id == user_prefs.user_id, PortfolioItem.stock_id.isnot(None))
+    }
+    
+    recommendation_engine.ensure_fresh()
+    
+    # Create user preference vector
+    user_vector = create_user_preference_vector(user_prefs, recommendation_engine.columns)
+    
+    # Rank once per distinct preference vector, then drop this user's holdings
+    depth = top_n + CACHE_DEPTH_MARGIN
+    ranked = recommendation_cache.get_or_load(
+        preference_key(user_vector, depth),
+        lambda: [[rec['id'], rec['score']] for rec in recommendation_engine.recommend(user_vector, top_n=depth)]
+    )
+    picks = [(stock_id, score) for stock_id, score in ranked if stock_id not in portfolio_stocks][:top_n]
+    
+    # Holdings used up the margin of a full list; rank again with them excluded
+    if len(picks) < top_n and len(ranked) == depth:
+        return recommendation_engine.recommend(user_vector, exclude_ids=portfolio_stocks, top_n=top_n)
+    
+    stocks = recommendation_engine.stocks
+    return [dict(stocks[stock_id], score=score) for stock_id, score in picks if stock_id in stocks]
+
+def generate_all_recommendations(top_n=20, chunk_size=1000):
+    """
+    Regenerate stored recommendations for every user with preferences in one batch
+    
+    Args:
+        top_n (int): Maximum number of recommendations per user
+        chunk_size (int): Users scored per matrix multiply, bounds peak memory
+    
+    Returns:
+        int: Number of users whose recommendations were regenerated
+    """
+    try:
+        recommendation_engine.ensure_fresh()
+        if not recommendation_engine.stocks:
+            logger.error("No stocks found in database")
+            return 0
+        
+        all_prefs = UserPreference.query.all()
+        
+        # Holdings for every user in one query
+        holdings = {}
+        for user_id, stock_id in (
+            db.session.query(Portfolio.user_id, PortfolioItem.stock_id)
+            .join(PortfolioItem, PortfolioItem.portfolio_id == Portfolio.id)
+            .filter(PortfolioItem.stock_id.isnot(None))
+        ):
+            holdings.setdefault(user_id, set()).add(stock_id)
+        
+        columns = recommendation_engine.columns
+        processed = 0
+        
+        for start in range(0, len(all_prefs), chunk_size):
+            chunk = all_prefs[start:start + chunk_size]
+            user_matrix = np.array([create_user_preference_vector(prefs, columns) for prefs in chunk], dtype=np.float64)
+            user_holdings = [holdings.get(prefs.user_id, set()) for prefs in chunk]
             
-            # Set volatility based on sector or default to moderate
-            volatility = sector_volatility.get(stock.sector, 0.2)
+            # Users sharing a preference vector share one ranked list, deep enough
+            # that every user still has top_n stocks after their holdings are dropped
+            profiles, profile_of = np.unique(user_matrix, axis=0, return_inverse=True)
+            depth = top_n + max((len(held) for held in user_holdings), default=0)
+            profile_ids, profile_scores = recommendation_engine.recommend_many(profiles, top_n=depth)
             
-            # Randomize volume based on price (higher price = higher volume on average)
-            # For testing purposes only
-            avg_volume = stock.current_price * 10000 if stock.current_price else 500000
+            rankings = {}
+            for prefs, held, profile in zip(chunk, user_holdings, np.ravel(profile_of).tolist()):
+                rankings[prefs.user_id] = [
+                    (stock_id, score)
+                    for stock_id, score in zip(profile_ids[profile].tolist(), profile_scores[profile].tolist())
+                    if stock_id >= 0 and np.isfinite(score) and stock_id not in held
+                ][:top_n]
             
-            # Create feature vector for the stock
-            stock_data = {
-                'id': stock.id,
-                'symbol': stock.symbol,
-                'price': stock.current_price,
-                'sector': stock.sector if stock.sector else 'Unknown',
-                'market': stock.market if stock.market else 'Unknown',
-                'volatility': volatility,
-                'avg_volume': avg_volume
-            }
+            save_recommendations(rankings)
             
-            stocks_data.append(stock_data)
-        
-        if not stocks_data:
-            logger.error("No valid stock data for recommendations")
-            return False
+            processed += len(chunk)
+            logger.info(f"Regenerated recommendations for {processed}/{len(all_prefs)} users")
         
-        # Convert to DataFrame
-        df_stocks = pd.DataFrame(stocks_data)
-        
-        # Create feature matrix
-        # One-hot encode categorical features
-        df_sectors = pd.get_dummies(df_stocks['sector'], prefix='sector')
-        df_markets = pd.get_dummies(df_stocks['market'], prefix='market')
-        
-        # Create numerical features
-        df_features = pd.DataFrame({
-            'price': df_stocks['price'],
-            'volatility': df_stocks['volatility'],
-            'avg_volume': df_stocks['avg_volume']
-        })
-        
-        # Scale numerical features
-        scaler = StandardScaler()
-        scaled_features = scaler.fit_transform(df_features)
-        df_scaled = pd.DataFrame(scaled_features, columns=df_features.columns)
-        
-        # Combine all features
-        df_final = pd.concat([df_scaled, df_sectors, df_markets], axis=1)
-        
-        # Create user preference vector
-        user_vector = create_user_preference_vector(user_prefs, df_final.columns)
-        
-        # Calculate similarity scores
-        similarity_scores = cosine_similarity([user_vector], df_final.values)[0]
-        
-        # Add scores to stocks data
-        for i, score in enumerate(similarity_scores):
-            stocks_data[i]['score'] = score
-        
-        # Sort by score
-        sorted_recommendations = sorted(stocks_data, key=lambda x: x['score'], reverse=True)
-        
-        # Limit to top recommendations
-        top_recommendations = sorted_recommendations[:20]
-        
-        # Clear previous recommendations
-        Recommendation.query.filter_by(user_id=user_id).delete()
-        
-        # Add new recommendations to database
-        for rec in top_recommendations:
-            reason = generate_recommendation_reason(rec, user_prefs)
-            
-            recommendation = Recommendation(
-                user_id=user_id,
-                stock_id=rec['id'],
-                score=float(rec['score']),
-                reason=reason,
-                created_at=datetime.utcnow()
-            )
-            db.session.add(recommendation)
-        
-        db.session.commit()
-        return True
+        return processed
     
     except Exception as e:
-        logger.error(f"Error generating recommendations: {e}")
+        logger.error(f"Error generating batch recommendations: {e}")
         db.session.rollback()
-        return False
+        return 0
 
 def create_user_preference_vector(user_prefs, feature_columns):
     """
@@ -214,37 +275,50 @@ def create_user_preference_vector(user_prefs, feature_columns):
     
     return user_vector
 
-def generate_recommendation_reason(stock_data, user_prefs):
+# Average daily dollar volume above which a stock is described as liquid
+LIQUID_DOLLAR_VOLUME = 10000000
+
+def volatility_bucket(volatility):
     """
-    Generate a human-readable reason for the recommendation
+    Bucket annualized volatility the way reasons describe it
     
     Args:
-        stock_data (dict): Stock data with features
-        user_prefs (UserPreference): User preference object
+        volatility (float): Annualized realized volatility, or None if unknown
     
     Returns:
-        str: Recommendation reason
+        str: 'low', 'moderate', 'high' or None
     """
+    if volatility is None:
+        return None
+    if volatility < 0.2:
+        return 'low'
+    if volatility <= 0.4:
+        return 'moderate'
+    return 'high'
+
+@lru_cache(maxsize=1024)
+def _reason_text(sector, market, risk_tolerance, volatility_level, liquid):
+    """Reason sentence for one combination of matched preferences and feature buckets"""
     reasons = []
     
     # Check if sector matches preference
-    if user_prefs.preferred_sectors and stock_data['sector'] in user_prefs.preferred_sectors:
-        reasons.append(f"This stock is in your preferred {stock_data['sector']} sector")
+    if sector:
+        reasons.append(f"This stock is in your preferred {sector} sector")
     
     # Check if market matches preference
-    if user_prefs.preferred_markets and stock_data['market'] in user_prefs.preferred_markets:
-        reasons.append(f"This stock is in your preferred {stock_data['market']} market")
+    if market:
+        reasons.append(f"This stock is in your preferred {market} market")
     
     # Check volatility against risk tolerance
-    if user_prefs.risk_tolerance == 'low' and stock_data['volatility'] < 0.2:
+    if risk_tolerance == 'low' and volatility_level == 'low':
         reasons.append("This stock has low volatility, matching your conservative risk profile")
-    elif user_prefs.risk_tolerance == 'medium' and 0.2 <= stock_data['volatility'] <= 0.4:
+    elif risk_tolerance == 'medium' and volatility_level == 'moderate':
         reasons.append("This stock has moderate volatility, suitable for your balanced risk profile")
-    elif user_prefs.risk_tolerance == 'high' and stock_data['volatility'] > 0.4:
+    elif risk_tolerance == 'high' and volatility_level == 'high':
         reasons.append("This stock has higher volatility, aligning with your aggressive risk profile")
     
-    # Check volume for liquidity
-    if stock_data['avg_volume'] > 1000000:
+    # Check average daily dollar volume for liquidity
+    if liquid:
         reasons.append("This stock has high trading volume, indicating good liquidity")
     
     # If no specific reasons, provide a generic one
@@ -253,21 +327,115 @@ def generate_recommendation_reason(stock_data, user_prefs):
     
     return " and ".join(reasons) + "."
 
-def calculate_portfolio_performance(portfolio_id):
+def generate_recommendation_reason(stock_data, user_prefs):
+    """
+    Generate a human-readable reason for the recommendation
+    
+    The text only depends on which preferences match and on the volatility and
+    volume buckets, so it is looked up from a memoized table at render time.
+    
+    Args:
+        stock_data (dict): Stock data with sector, market, volatility and avg_volume
+        user_prefs (UserPreference): User preference object
+    
+    Returns:
+        str: Recommendation reason
+    """
+    sector = stock_data.get('sector')
+    market = stock_data.get('market')
+    avg_volume = stock_data.get('avg_volume')
+    
+    return _reason_text(
+        sector if user_prefs.preferred_sectors and sector in user_prefs.preferred_sectors else None,
+        market if user_prefs.preferred_markets and market in user_prefs.preferred_markets else None,
+        user_prefs.risk_tolerance,
+        volatility_bucket(stock_data.get('volatility')),
+        avg_volume is not None and avg_volume > LIQUID_DOLLAR_VOLUME
+    )
+
+def stock_recommendation_reason(stock, user_prefs):
+    """
+    Reason for a stored recommendation, from its stock and precomputed features
+    
+    Args:
+        stock (Stock): Stock with its features relationship loaded
+        user_prefs (UserPreference): User preference object
+    
+    Returns:
+        str: Recommendation reason
+    """
+    features = stock.features
+    return generate_recommendation_reason({
+        'sector': stock.sector,
+        'market': stock.market,
+        'volatility': features.volatility if features else None,
+        'avg_volume': features.avg_dollar_volume if features else None
+    }, user_prefs)
+
+# Lookback window in days for each supported performance range
+PERFORMANCE_RANGES = {
+    '1m': 30,
+    '3m': 90,
+    '6m': 180,
+    '1y': 365,
+    '5y': 5 * 365
+}
+
+def _timeline_values_from_db(stock_ids, quantities, start_date, end_date, sample_dates):
+    """Portfolio value at each sample date, read from StockHistory in one query"""
+    # Latest close on or before the first sample date anchors the forward fill
+    anchor_dates = as_of_dates_subquery(stock_ids, start_date)
+    
+    # Single query for the whole window across all held stocks
+    history = (
+        db.session.query(StockHistory.stock_id, StockHistory.date, StockHistory.close_price)
+        .filter(
+            StockHistory.stock_id.in_(stock_ids),
+            db.or_(
+                StockHistory.date.between(start_date, end_date),
+                db.tuple_(StockHistory.stock_id, StockHistory.date).in_(anchor_dates)
+            )
+        )
+        .all()
+    )
+    
+    if history:
+        df_history = pd.DataFrame(history, columns=['stock_id', 'date', 'close_price'])
+        df_history['date'] = pd.to_datetime(df_history['date'])
+        
+        # Align into a dates x stocks close-price matrix, carrying the last close forward
+        closes = df_history.pivot_table(index='date', columns='stock_id', values='close_price', aggfunc='last')
+        closes = closes.reindex(closes.index.union(sample_dates)).ffill().reindex(sample_dates)
+        closes = closes.reindex(columns=stock_ids).fillna(0.0)
+        
+        values = closes.to_numpy() @ quantities.to_numpy(dtype=np.float64)
+    else:
+        values = np.zeros(len(sample_dates))
+    
+    return values
+
+def calculate_portfolio_performance(portfolio_id, days=30, points=7):
     """
     Calculate performance metrics for a portfolio
     
     Args:
         portfolio_id (int): Portfolio ID
+        days (int): Length of the performance timeline in days
+        points (int): Number of evenly spaced timeline points, or None for daily resolution
     
     Returns:
         dict: Performance metrics
     """
     try:
-        # Get portfolio items
-        portfolio_items = PortfolioItem.query.filter_by(portfolio_id=portfolio_id).all()
-        
-        if not portfolio_items:
+        # Get stock holdings together with their current prices
+        holdings = (
+            db.session.query(PortfolioItem.stock_id, PortfolioItem.quantity, PortfolioItem.purchase_price, Stock.current_price)
+            .join(Stock, PortfolioItem.stock_id == Stock.id)
+            .filter(PortfolioItem.portfolio_id == portfolio_id)
+            .all()
+        )
+        
+        if not holdings:
             return {
                 'total_value': 0,
                 'total_cost': 0,
@@ -276,59 +444,42 @@ def calculate_portfolio_performance(portfolio_id):
                 'performance_timeline': []
             }
         
-        # Calculate current values
-        total_current_value = 0
-        total_cost = 0
-        stock_ids = []
+        df_holdings = pd.DataFrame(holdings, columns=['stock_id', 'quantity', 'purchase_price', 'current_price'])
         
-        for item in portfolio_items:
-            stock = Stock.query.get(item.stock_id)
-            stock_ids.append(stock.id)
-            
-            if stock:
-                current_value = stock.current_price * item.quantity
-                cost_basis = item.purchase_price * item.quantity
-                
-                total_current_value += current_value
-                total_cost += cost_basis
+        # Calculate current values
+        total_current_value = float((df_holdings['current_price'].fillna(0) * df_holdings['quantity']).sum())
+        total_cost = float((df_holdings['purchase_price'] * df_holdings['quantity']).sum())
         
         # Calculate total return
         total_return = total_current_value - total_cost
         total_return_percent = (total_return / total_cost) * 100 if total_cost > 0 else 0
         
-        # Calculate historical performance (only 7 data points for the past month)
+        # Sample dates at regular intervals, or every day if no point count is given
         end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=30)
+        start_date = end_date - timedelta(days=days)
         
-        performance_timeline = []
-        
-        # Use exactly 7 data points (weekly) for consistency
-        data_points = 7
-        day_interval = max(1, 30 // (data_points - 1))  # Ensure positive interval
+        if points and points > 1:
+            day_interval = max(1, days // (points - 1))  # Ensure positive interval
+            sample_offsets = list(range(0, days + 1, day_interval))[:points]
+        else:
+            sample_offsets = list(range(0, days + 1))
+        sample_dates = pd.DatetimeIndex(sorted(pd.Timestamp(end_date - timedelta(days=i)) for i in sample_offsets))
         
-        # Only use up to 7 data points to prevent chart expansion
-        sample_days = [i for i in range(0, 31, day_interval)][:7]  # Limit to 7 points
+        quantities = df_holdings.groupby('stock_id')['quantity'].sum()
+        stock_ids = quantities.index.tolist()
         
-        for i in sample_days:  # Sample at regular intervals with a fixed number of points
-            day = end_date - timedelta(days=i)
-            day_value = 0
-            
-            for item in portfolio_items:
-                history = StockHistory.query.filter(
-                    StockHistory.stock_id == item.stock_id,
-                    StockHistory.date <= day
-                ).order_by(StockHistory.date.desc()).first()
-                
-                if history:
-                    day_value += history.close_price * item.quantity
-            
-            performance_timeline.append({
-                'date': day.strftime('%Y-%m-%d'),
-                'value': day_value
-            })
+        # Serve closes from the shared price matrix when it covers every holding
+        store = get_price_store()
+        if store is not None and store.has_stocks(stock_ids):
+            closes = np.nan_to_num(store.closes_as_of(stock_ids, sample_dates.values))
+            values = closes @ quantities.to_numpy(dtype=np.float64)
+        else:
+            values = _timeline_values_from_db(stock_ids, quantities, start_date, end_date, sample_dates)
         
-        # Reverse to get chronological order
-        performance_timeline.reverse()
+        performance_timeline = [
+            {'date': day.strftime('%Y-%m-%d'), 'value': float(value)}
+            for day, value in zip(sample_dates, values)
+        ]
         
         return {
             'total_value': total_current_value,
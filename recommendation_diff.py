@@ -0,0 +1,49 @@
+"""
+Difference between stored recommendations and freshly computed rankings.
+
+Kept free of database imports so the write plan save_recommendations sends
+can be checked on its own.
+"""
+
+# Score changes smaller than this do not rewrite a stored recommendation
+SCORE_TOLERANCE = 1e-9
+
+def diff_rankings(stored, rankings, tolerance=SCORE_TOLERANCE):
+    """
+    Split new rankings into rows to upsert and rows to delete
+
+    Stocks that stayed with an unchanged score produce no row at all, so
+    their stored row (and created_at) is left alone.
+
+    Args:
+        stored (dict): User ID -> {stock_id: (recommendation_id, score)} as currently stored
+        rankings (dict): User ID -> list of (stock_id, score) for the new top-k
+        tolerance (float): Largest score change that still counts as unchanged
+
+    Returns:
+        tuple: (upserts, deletes, counts) where upserts are {'user_id', 'stock_id', 'score'}
+        dicts for new and changed rows, deletes are the IDs of rows whose stock dropped
+        out, and counts has the number of rows inserted, updated and deleted
+    """
+    upserts, deletes = [], []
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+    for user_id, ranked in rankings.items():
+        current = stored.get(user_id, {})
+        wanted = {stock_id: float(score) for stock_id, score in ranked}
+
+        for stock_id, (rec_id, score) in current.items():
+            if stock_id not in wanted:
+                deletes.append(rec_id)
+
+        for stock_id, score in wanted.items():
+            if stock_id not in current:
+                counts['inserted'] += 1
+            elif abs(score - current[stock_id][1]) > tolerance:
+                counts['updated'] += 1
+            else:
+                continue
+            upserts.append({'user_id': user_id, 'stock_id': stock_id, 'score': score})
+
+    counts['deleted'] = len(deletes)
+    return upserts, deletes, counts
@@ -0,0 +1,270 @@
+"""
+In-process recommendation engine.
+
+Keeps the scaled stock feature vectors in a similarity index (see
+similarity_index) so that scoring a user is a top-k lookup instead of a full
+DataFrame/scaler/similarity rebuild. Stock inserts, updates and deletes made
+through the ORM are applied to the index incrementally; changes made by other
+processes are picked up by a periodic fingerprint check and a full rebuild.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from sqlalchemy import event, func
+
+from app import db
+from models import Stock, StockFeatures
+from similarity_index import create_index
+
+logger = logging.getLogger(__name__)
+
+# Neutral values for stocks with no precomputed features when no other stock has them either
+DEFAULT_FEATURES = {'volatility': 0.2, 'avg_volume': 0.0}
+
+NUMERIC_FEATURES = ['price', 'volatility', 'avg_volume']
+
+STOCK_COLUMNS = [
+    'id', 'symbol', 'name', 'price', 'sector', 'market',
+    'volatility', 'avg_volume', 'momentum', 'max_drawdown'
+]
+
+
+class RecommendationEngine:
+    def __init__(self, check_interval=60, backend=None):
+        """
+        Args:
+            check_interval (float): Seconds between cross-process staleness checks against the stocks table
+            backend (str): Similarity index backend, 'exact' or 'ivf' (RECOMMENDATION_INDEX if None)
+        """
+        self.check_interval = check_interval
+        self.backend = backend
+        self.version = 0
+        self.columns = []
+        self.stocks = {}
+        self.index = create_index(0, backend)
+
+        self._scaler = None
+        self._fill_values = dict(DEFAULT_FEATURES)
+        self._pending_upserts = set()
+        self._pending_deletes = set()
+        self._fingerprint = None
+        self._last_check = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+        # Guards index mutation and lookups; held only briefly so rebuilds do not block readers
+        self._index_lock = threading.Lock()
+
+    def invalidate(self):
+        """Mark the feature matrix as stale so it is rebuilt on next use"""
+        self._dirty = True
+
+    def stock_changed(self, stock_id):
+        """Queue a stock to be re-encoded into the index on next use"""
+        with self._index_lock:
+            self._pending_deletes.discard(stock_id)
+            self._pending_upserts.add(stock_id)
+
+    def stock_deleted(self, stock_id):
+        """Queue a stock to be dropped from the index on next use"""
+        with self._index_lock:
+            self._pending_upserts.discard(stock_id)
+            self._pending_deletes.add(stock_id)
+
+    def _stock_fingerprint(self):
+        """Cheap aggregate over the stocks and features tables used to detect changes made by other processes"""
+        features_computed = db.session.query(func.max(StockFeatures.computed_at)).scalar_subquery()
+        count, max_id, last_update, last_features = db.session.query(
+            func.count(Stock.id), func.max(Stock.id), func.max(Stock.price_updated_at), features_computed
+        ).one()
+        return count, max_id, last_update, last_features
+
+    def ensure_fresh(self):
+        """Rebuild the index if stocks changed elsewhere, otherwise apply queued local changes"""
+        now = time.monotonic()
+        if self._dirty or now - self._last_check >= self.check_interval:
+            fingerprint = self._stock_fingerprint()
+            self._last_check = now
+            if self._dirty or fingerprint != self._fingerprint:
+                self.refresh(fingerprint)
+                return
+
+        if self._pending_upserts or self._pending_deletes:
+            self._apply_pending()
+
+    def _load_stocks(self, stock_ids=None):
+        """Stocks and their nightly features in one query, optionally limited to some IDs"""
+        query = db.session.query(
+            Stock.id, Stock.symbol, Stock.name, Stock.current_price, Stock.sector, Stock.market,
+            StockFeatures.volatility, StockFeatures.avg_dollar_volume,
+            StockFeatures.momentum, StockFeatures.max_drawdown
+        ).outerjoin(StockFeatures, StockFeatures.stock_id == Stock.id)
+        if stock_ids is not None:
+            query = query.filter(Stock.id.in_(stock_ids))
+
+        df_stocks = pd.DataFrame(query.all(), columns=STOCK_COLUMNS)
+        df_stocks['price'] = df_stocks['price'].astype(float).fillna(0.0)
+        df_stocks['sector'] = df_stocks['sector'].fillna('Unknown')
+        df_stocks['market'] = df_stocks['market'].fillna('Unknown')
+        for column in DEFAULT_FEATURES:
+            df_stocks[column] = df_stocks[column].astype(float)
+        return df_stocks
+
+    def _encode(self, df_stocks, columns, scaler):
+        """
+        Feature vectors for stocks aligned with columns
+
+        Returns:
+            np.ndarray: One row per stock, or None if a stock has a sector or market
+                        the current columns do not know about
+        """
+        # Dollar volume spans orders of magnitude, so it is scaled on a log axis
+        numeric = df_stocks[NUMERIC_FEATURES].assign(avg_volume=np.log1p(df_stocks['avg_volume'].clip(lower=0)))
+        column_of = {column: i for i, column in enumerate(columns)}
+
+        matrix = np.zeros((len(df_stocks), len(columns)))
+        matrix[:, :len(NUMERIC_FEATURES)] = scaler.transform(numeric)
+        for prefix in ('sector', 'market'):
+            cols = df_stocks[prefix].map(lambda value: column_of.get(f'{prefix}_{value}'))
+            if cols.isna().any():
+                return None
+            matrix[np.arange(len(df_stocks)), cols.astype(int).to_numpy()] = 1.0
+        return matrix
+
+    def _stock_records(self, df_stocks):
+        return df_stocks.astype(object).where(df_stocks.notna(), None).to_dict('records')
+
+    def refresh(self, fingerprint=None):
+        """
+        Rebuild the scaler, feature columns and similarity index from the stocks table
+
+        Args:
+            fingerprint (tuple): Precomputed table fingerprint, queried if omitted
+        """
+        with self._lock:
+            if fingerprint is None:
+                fingerprint = self._stock_fingerprint()
+            # Clear the flag first so changes made while we build trigger another rebuild
+            self._dirty = False
+            with self._index_lock:
+                self._pending_upserts.clear()
+                self._pending_deletes.clear()
+
+            df_stocks = self._load_stocks()
+
+            # Stocks without enough history sit at the universe median so they score neutrally
+            fill_values = {
+                column: df_stocks[column].median() if df_stocks[column].notna().any() else default
+                for column, default in DEFAULT_FEATURES.items()
+            }
+            df_stocks = df_stocks.fillna(fill_values)
+
+            columns = list(NUMERIC_FEATURES)
+            columns += [f'sector_{sector}' for sector in sorted(df_stocks['sector'].unique())]
+            columns += [f'market_{market}' for market in sorted(df_stocks['market'].unique())]
+
+            index = create_index(len(columns), self.backend)
+            scaler = None
+            if not df_stocks.empty:
+                numeric = df_stocks[NUMERIC_FEATURES].assign(avg_volume=np.log1p(df_stocks['avg_volume'].clip(lower=0)))
+                scaler = StandardScaler().fit(numeric)
+                index.add(df_stocks['id'].tolist(), self._encode(df_stocks, columns, scaler))
+
+            with self._index_lock:
+                self.columns = columns
+                self._scaler = scaler
+                self._fill_values = fill_values
+                self.index = index
+                self.stocks = {stock['id']: stock for stock in self._stock_records(df_stocks)}
+                self._fingerprint = fingerprint
+                self.version += 1
+            logger.info(f"Recommendation engine rebuilt with {len(self.stocks)} stocks (version {self.version})")
+
+    def _apply_pending(self):
+        """Re-encode changed stocks and drop deleted ones without refitting the scaler"""
+        with self._index_lock:
+            upserts, self._pending_upserts = self._pending_upserts, set()
+            deletes, self._pending_deletes = self._pending_deletes, set()
+
+        df_stocks = self._load_stocks(list(upserts)) if upserts else pd.DataFrame(columns=STOCK_COLUMNS)
+        # Stocks queued for upsert that no longer exist were rolled back or deleted
+        deletes |= upserts - set(df_stocks['id'].tolist())
+        df_stocks = df_stocks.fillna(self._fill_values)
+
+        with self._index_lock:
+            matrix = None
+            if self._scaler is not None and not df_stocks.empty:
+                matrix = self._encode(df_stocks, self.columns, self._scaler)
+            # Nothing fitted yet, or a new sector or market needs new columns
+            rebuild = self._scaler is None or (matrix is None and not df_stocks.empty)
+
+            if not rebuild:
+                self.index.remove(deletes)
+                for stock_id in deletes:
+                    self.stocks.pop(stock_id, None)
+                if matrix is not None:
+                    self.index.add(df_stocks['id'].tolist(), matrix)
+                    self.stocks.update((stock['id'], stock) for stock in self._stock_records(df_stocks))
+                self.version += 1
+
+        if rebuild:
+            self.refresh()
+
+    def recommend_many(self, user_matrix, exclude_ids=None, top_n=20):
+        """
+        Rank stocks for many users in one index lookup
+
+        Args:
+            user_matrix (np.ndarray): One user preference vector per row, aligned with self.columns
+            exclude_ids (list): Per-user iterables of stock IDs to leave out, aligned with user_matrix rows
+            top_n (int): Maximum number of recommendations per user
+
+        Returns:
+            tuple: (stock_ids, scores) arrays of shape (users, top_n), best first; slots
+                   without a stock carry an ID of -1 and a score of -inf
+        """
+        user_matrix = np.asarray(user_matrix, dtype=np.float64)
+        with self._index_lock:
+            if user_matrix.shape[1:] != (self.index.dim,):
+                return np.full((len(user_matrix), top_n), -1, dtype=np.int64), np.full((len(user_matrix), top_n), -np.inf)
+            return self.index.search_many(user_matrix, top_n, exclude_ids)
+
+    def recommend(self, user_vector, exclude_ids=(), top_n=20):
+        """
+        Rank stocks for a user vector
+
+        Args:
+            user_vector (list): User preference vector aligned with self.columns
+            exclude_ids (iterable): Stock IDs to leave out (e.g. already held)
+            top_n (int): Maximum number of recommendations
+
+        Returns:
+            list: Stock feature dicts with a 'score' key, best first
+        """
+        user_vector = np.asarray(user_vector, dtype=np.float64)
+        with self._index_lock:
+            if len(self.index) == 0 or user_vector.shape != (self.index.dim,):
+                return []
+            stock_ids, scores = self.index.search(user_vector, top_n, exclude_ids)
+            return [
+                dict(self.stocks[stock_id], score=float(score))
+                for stock_id, score in zip(stock_ids.tolist(), scores.tolist())
+            ]
+
+
+# Create a singleton instance
+recommendation_engine = RecommendationEngine()
+
+
+@event.listens_for(Stock, 'after_insert')
+@event.listens_for(Stock, 'after_update')
+def _index_stock_change(mapper, connection, target):
+    recommendation_engine.stock_changed(target.id)
+
+
+@event.listens_for(Stock, 'after_delete')
+def _index_stock_delete(mapper, connection, target):
+    recommendation_engine.stock_deleted(target.id)
@@ -6,14 +6,38 @@ import json
 from datetime import datetime, timedelta
 
 from app import app, db
-from models import User, UserPreference, Stock, Portfolio, PortfolioItem, Recommendation, News, StockHistory, RealEstate, Cryptocurrency
-from data_fetcher import get_stock_data, search_stocks, get_stock_price, get_news_data, get_alpha_vantage_news
-from recommendation import generate_recommendations, calculate_portfolio_performance
-from sentiment_analysis import analyze_sentiment
+from models import User, UserPreference, Stock, Portfolio, PortfolioItem, News
+from data_fetcher import get_stock_data, search_stocks, get_stock_price, get_news_data, get_alpha_vantage_news, get_stock_prices, quote_cache
+from recommendation import generate_recommendations, recommend_for_user, generate_recommendation_reason, stock_recommendation_reason, calculate_portfolio_performance, PERFORMANCE_RANGES, recommendation_cache
 from news_service import news_service
+from history_queries import get_history_frame, get_history_summary
+from downsampling import lttb_indices, ohlc_buckets
+from history_ingest import hydrate_stock_history
+from job_queue import job_queue
+from portfolio_service import get_user_portfolio, get_portfolio_item, get_user_recommendations, summarize_portfolio
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on symbols per batched quote request
+MAX_BATCH_SYMBOLS = 200
+
+# Chart series ranges in days (None = all stored history) and point budget
+SERIES_RANGES = dict(PERFORMANCE_RANGES, max=None)
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 5000
+
+# Page size bounds for /api/news
+DEFAULT_NEWS_PAGE_SIZE = 20
+MAX_NEWS_PAGE_SIZE = 100
+
+def chart_series(history):
+    """Columnar chart data from a history frame indexed by date"""
+    return {
+        'dates': history.index.strftime('%Y-%m-%d').tolist(),
+        'prices': history['close_price'].tolist(),
+        'volumes': history['volume'].tolist()
+    }
+
 # Create news blueprint
 news_bp = Blueprint('news', __name__)
 
@@ -118,6 +142,10 @@ def profile():
             db.session.add(user_preferences)
         
         db.session.commit()
+        
+        # Preferences changed, so re-rank against the precomputed feature matrix
+        generate_recommendations(current_user.id)
+        
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('dashboard'))
     
@@ -149,47 +177,25 @@ def dashboard():
         flash('Please set your investment preferences to get personalized recommendations.', 'info')
         return redirect(url_for('profile'))
     
-    # Get user's portfolio
-    portfolio = Portfolio.query.filter_by(user_id=current_user.id).first()
+    # Get user's portfolio with all holdings loaded up front
+    portfolio = get_user_portfolio(current_user.id)
+    summary = summarize_portfolio(portfolio)
     
-    if portfolio:
-        portfolio_items = PortfolioItem.query.filter_by(portfolio_id=portfolio.id).all()
-        portfolio_value = 0
-        portfolio_stocks = []
-        
-        for item in portfolio_items:
-            stock = Stock.query.get(item.stock_id)
-            if stock:
-                current_value = stock.current_price * item.quantity
-                portfolio_value += current_value
-                portfolio_stocks.append({
-                    'symbol': stock.symbol,
-                    'name': stock.name,
-                    'quantity': item.quantity,
-                    'purchase_price': item.purchase_price,
-                    'current_price': stock.current_price,
-                    'current_value': current_value,
-                    'profit_loss': current_value - (item.purchase_price * item.quantity),
-                    'profit_loss_percent': ((stock.current_price - item.purchase_price) / item.purchase_price) * 100
-                })
-    else:
-        portfolio_items = []
-        portfolio_value = 0
-        portfolio_stocks = []
+    portfolio_stocks = [item for item in summary['items'] if item['type'] == 'stock']
+    portfolio_value = sum(item['current_value'] for item in portfolio_stocks)
     
     # Get recommendations
-    recommendations = Recommendation.query.filter_by(user_id=current_user.id).order_by(Recommendation.score.desc()).limit(5).all()
+    recommendations = get_user_recommendations(current_user.id, limit=5)
     recommended_stocks = []
     
     for rec in recommendations:
-        stock = Stock.query.get(rec.stock_id)
+        stock = rec.stock
         if stock:
             recommended_stocks.append({
                 'symbol': stock.symbol,
                 'name': stock.name,
                 'price': stock.current_price,
-                'score': rec.score,
-                'reason': rec.reason
+                'score': rec.score
             })
     
     # Get latest news with sentiment
@@ -244,49 +250,19 @@ def stock_details(symbol):
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=90)  # Last 90 days
     
-    history = StockHistory.query.filter(
-        StockHistory.stock_id == stock.id,
-        StockHistory.date.between(start_date, end_date)
-    ).order_by(StockHistory.date).all()
+    history = get_history_frame(stock.id, start_date, end_date)
     
-    # Check if we need to fetch history
-    if not history:
-        try:
-            # Fetch historical data
-            history_data = get_stock_data(symbol, historical=True)
-            
-            # Save historical data
-            for date_str, data in history_data.items():
-                if isinstance(data, dict):
-                    history_item = StockHistory(
-                        stock_id=stock.id,
-                        date=datetime.strptime(date_str, '%Y-%m-%d').date(),
-                        open_price=data.get('open', 0),
-                        high_price=data.get('high', 0),
-                        low_price=data.get('low', 0),
-                        close_price=data.get('close', 0),
-                        volume=data.get('volume', 0)
-                    )
-                    db.session.add(history_item)
-            
-            db.session.commit()
-            
-            # Query the newly saved history
-            history = StockHistory.query.filter(
-                StockHistory.stock_id == stock.id,
-                StockHistory.date.between(start_date, end_date)
-            ).order_by(StockHistory.date).all()
-        except Exception as e:
-            logger.error(f"Error fetching historical data: {e}")
-            flash('Error fetching historical data for this stock.', 'danger')
+    # Cold symbol: hydrate in the background and let the page poll for the chart data
+    history_pending = False
+    if history.empty:
+        job_queue.submit(f'hydrate:{stock.symbol}', hydrate_stock_history, stock.id, stock.symbol)
+        history_pending = True
     
     # Get related news
-    related_news = News.query.filter(News.related_symbols.any(symbol)).order_by(News.published_at.desc()).limit(5).all()
+    related_news = News.query.filter(News.related_to(symbol)).order_by(News.published_at.desc()).limit(5).all()
     
     # Prepare data for charts
-    dates = [h.date.strftime('%Y-%m-%d') for h in history]
-    prices = [h.close_price for h in history]
-    volumes = [h.volume for h in history]
+    chart = chart_series(history)
     
     # Check if user has this stock in portfolio
     portfolio = Portfolio.query.filter_by(user_id=current_user.id).first()
@@ -301,105 +277,24 @@ def stock_details(symbol):
     return render_template(
         'stock_details.html',
         stock=stock,
-        dates=json.dumps(dates),
-        prices=json.dumps(prices),
-        volumes=json.dumps(volumes),
+        dates=json.dumps(chart['dates']),
+        prices=json.dumps(chart['prices']),
+        volumes=json.dumps(chart['volumes']),
         portfolio_item=portfolio_item,
-        news=related_news
+        news=related_news,
+        history_pending=history_pending
     )
 
 # Portfolio management
 @app.route('/portfolio')
 @login_required
 def portfolio():
-    portfolio = Portfolio.query.filter_by(user_id=current_user.id).first()
+    portfolio = get_user_portfolio(current_user.id, create=True)
     
-    if not portfolio:
-        portfolio = Portfolio(user_id=current_user.id, name="Default Portfolio", description="My main investment portfolio")
-        db.session.add(portfolio)
-        db.session.commit()
-    
-    portfolio_items = PortfolioItem.query.filter_by(portfolio_id=portfolio.id).all()
-    portfolio_data = []
-    total_value = 0
-    total_investment = 0
-    
-    for item in portfolio_items:
-        if item.investment_type == 'stock':
-            investment = Stock.query.get(item.stock_id)
-            if investment:
-                current_value = investment.current_price * item.quantity
-                initial_value = item.purchase_price * item.quantity
-                profit_loss = current_value - initial_value
-                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
-                
-                portfolio_data.append({
-                    'id': item.id,
-                    'type': 'stock',
-                    'symbol': investment.symbol,
-                    'name': investment.name,
-                    'sector': investment.sector,
-                    'quantity': item.quantity,
-                    'purchase_price': item.purchase_price,
-                    'current_price': investment.current_price,
-                    'current_value': current_value,
-                    'profit_loss': profit_loss,
-                    'profit_loss_percent': profit_loss_percent,
-                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
-                })
-                
-                total_value += current_value
-                total_investment += initial_value
-                
-        elif item.investment_type == 'real_estate':
-            investment = RealEstate.query.get(item.real_estate_id)
-            if investment:
-                current_value = investment.current_value
-                initial_value = item.purchase_price
-                profit_loss = current_value - initial_value
-                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
-                
-                portfolio_data.append({
-                    'id': item.id,
-                    'type': 'real_estate',
-                    'name': investment.name,
-                    'location': investment.location,
-                    'property_type': investment.property_type,
-                    'quantity': 1,  # Real estate is typically one unit
-                    'purchase_price': item.purchase_price,
-                    'current_value': current_value,
-                    'profit_loss': profit_loss,
-                    'profit_loss_percent': profit_loss_percent,
-                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
-                })
-                
-                total_value += current_value
-                total_investment += initial_value
-                
-        elif item.investment_type == 'cryptocurrency':
-            investment = Cryptocurrency.query.get(item.cryptocurrency_id)
-            if investment:
-                current_value = investment.current_price * item.quantity
-                initial_value = item.purchase_price * item.quantity
-                profit_loss = current_value - initial_value
-                profit_loss_percent = (profit_loss / initial_value) * 100 if initial_value > 0 else 0
-                
-                portfolio_data.append({
-                    'id': item.id,
-                    'type': 'cryptocurrency',
-                    'symbol': investment.symbol,
-                    'name': investment.name,
-                    'quantity': item.quantity,
-                    'purchase_price': item.purchase_price,
-                    'current_price': investment.current_price,
-                    'current_value': current_value,
-                    'profit_loss': profit_loss,
-                    'profit_loss_percent': profit_loss_percent,
-                    'purchase_date': item.purchase_date.strftime('%Y-%m-%d')
-                })
-                
-                total_value += current_value
-                total_investment += initial_value
+    summary = summarize_portfolio(portfolio)
+    portfolio_data = summary['items']
+    total_value = summary['total_value']
+    total_investment = summary['total_investment']
     
     # Calculate portfolio performance
     total_profit_loss = total_value - total_investment
@@ -488,6 +383,7 @@ def add_to_portfolio():
             # Add new stock to portfolio
             portfolio_item = PortfolioItem(
                 portfolio_id=portfolio.id,
+                investment_type='stock',
                 stock_id=stock.id,
                 quantity=quantity,
                 purchase_price=purchase_price,
@@ -508,21 +404,20 @@ def add_to_portfolio():
 @login_required
 def delete_from_portfolio(item_id):
     try:
-        portfolio_item = PortfolioItem.query.get(item_id)
+        portfolio_item = get_portfolio_item(item_id)
         
         if not portfolio_item:
             flash('Portfolio item not found.', 'danger')
             return redirect(url_for('portfolio'))
         
         # Ensure the portfolio belongs to the current user
-        portfolio = Portfolio.query.get(portfolio_item.portfolio_id)
-        
-        if portfolio.user_id != current_user.id:
+        if portfolio_item.portfolio.user_id != current_user.id:
             flash('Unauthorized action.', 'danger')
             return redirect(url_for('portfolio'))
         
         # Delete the portfolio item
-        stock_symbol = Stock.query.get(portfolio_item.stock_id).symbol
+        investment = portfolio_item.stock or portfolio_item.cryptocurrency or portfolio_item.real_estate
+        stock_symbol = getattr(investment, 'symbol', None) or investment.name
         db.session.delete(portfolio_item)
         db.session.commit()
         
@@ -543,13 +438,27 @@ def news():
 
 @app.route('/api/news', methods=['GET'])
 def get_news():
-    query = request.args.get('q', 'stock market')
-    result, status = news_service.get_news(query)
-    return jsonify(result), status
+    # Served from the news table; news_ingester.py fetches and scores articles in the background
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', DEFAULT_NEWS_PAGE_SIZE, type=int), 1), MAX_NEWS_PAGE_SIZE)
+    try:
+        return jsonify(news_service.get_stored_news(
+            query=request.args.get('q'),
+            symbol=request.args.get('symbol'),
+            page=page,
+            per_page=per_page
+        )), 200
+    except Exception as e:
+        logger.error(f"Error reading news: {e}")
+        return jsonify({'error': 'Failed to get news'}), 500
 
 @app.route('/api/news/status', methods=['GET'])
 def get_news_status():
-    return jsonify({'status': 'ok'}), 200
+    budget = news_service.rate_limit_status()
+    return jsonify({
+        'status': 'ok' if budget['remaining'] > 0 else 'exhausted',
+        'budget': budget
+    }), 200
 
 # Recommendations
 @app.route('/recommendations')
@@ -561,15 +470,12 @@ def recommendations():
         flash('Please set your investment preferences to get personalized recommendations.', 'info')
         return redirect(url_for('profile'))
     
-    # Generate new recommendations
-    generate_recommendations(current_user.id)
-    
-    # Get updated recommendations
-    recommendations = Recommendation.query.filter_by(user_id=current_user.id).order_by(Recommendation.score.desc()).all()
+    # Read precomputed recommendations; they are regenerated when preferences change
+    recommendations = get_user_recommendations(current_user.id)
     
     recommendation_data = []
     for rec in recommendations:
-        stock = Stock.query.get(rec.stock_id)
+        stock = rec.stock
         if stock:
             recommendation_data.append({
                 'id': rec.id,
@@ -578,12 +484,36 @@ def recommendations():
                 'sector': stock.sector,
                 'price': stock.current_price,
                 'score': rec.score,
-                'reason': rec.reason,
+                'reason': stock_recommendation_reason(stock, user_preferences),
                 'created_at': rec.created_at.strftime('%Y-%m-%d')
             })
     
+    if not recommendations:
+        # Nothing stored yet: score in memory without writing on a GET
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        for rec in recommend_for_user(user_preferences):
+            recommendation_data.append({
+                'id': None,
+                'symbol': rec['symbol'],
+                'name': rec['name'],
+                'sector': rec['sector'],
+                'price': rec['price'],
+                'score': rec['score'],
+                'reason': generate_recommendation_reason(rec, user_preferences),
+                'created_at': today
+            })
+    
     return render_template('recommendations.html', recommendations=recommendation_data)
 
+@app.route('/recommendations/refresh', methods=['POST'])
+@login_required
+def refresh_recommendations():
+    if generate_recommendations(current_user.id):
+        flash('Recommendations refreshed.', 'success')
+    else:
+        flash('Failed to generate recommendations. Please check your preferences.', 'danger')
+    return redirect(url_for('recommendations'))
+
 # Test route to generate recommendations
 @app.route('/test/generate-recommendations')
 @login_required
@@ -613,12 +543,17 @@ def test_generate_recommendations():
                 {"symbol": "NFLX", "name": "Netflix Inc.", "sector": "Entertainment", "market": "US"}
             ]
             
+            # Price every missing stock in one batched request
+            existing_symbols = {symbol for (symbol,) in db.session.query(Stock.symbol).filter(
+                Stock.symbol.in_([stock_data["symbol"] for stock_data in stock_list])
+            )}
+            prices = get_stock_prices([s["symbol"] for s in stock_list if s["symbol"] not in existing_symbols])
+            
             for stock_data in stock_list:
                 # Check if stock already exists
-                existing = Stock.query.filter_by(symbol=stock_data["symbol"]).first()
-                if not existing:
-                    # Get current price from API
-                    price_data = get_stock_price(stock_data["symbol"])
+                if stock_data["symbol"] not in existing_symbols:
+                    # Get current price from the batch result
+                    price_data = prices.get(stock_data["symbol"], {})
                     current_price = price_data.get('price', 100.0)  # Default to 100 if API fails
                     
                     stock = Stock(
@@ -667,19 +602,7 @@ def test_generate_news():
             flash('Failed to retrieve news from NewsAPI.org.', 'danger')
             return redirect(url_for('news'))
         
-        for item in result['articles']:
-            news_item = News(
-                title=item.get('title', ''),
-                url=item.get('url', ''),
-                source=item.get('source', {}).get('name', ''),
-                published_at=item.get('publishedAt', datetime.utcnow()),
-                summary=item.get('description', ''),
-                sentiment_score=analyze_sentiment(item.get('description', '')),
-                related_symbols=[]
-            )
-            db.session.add(news_item)
-        db.session.commit()
-        flash(f'Successfully generated {len(result["articles"])} news articles.', 'success')
+        flash(f"Successfully generated {result['inserted']} news articles.", 'success')
         return redirect(url_for('news'))
     
     except Exception as e:
@@ -698,6 +621,110 @@ def api_stock_price(symbol):
         logger.error(f"Error getting stock price: {e}")
         return jsonify({'error': 'Failed to get stock price'}), 500
 
+@app.route('/api/stock/<symbol>/history')
+@login_required
+def api_stock_history(symbol):
+    stock = Stock.query.filter_by(symbol=symbol).first()
+    if not stock:
+        return jsonify({'error': 'Stock not found'}), 404
+    
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=90)  # Last 90 days
+    history = get_history_frame(stock.id, start_date, end_date)
+    
+    if history.empty:
+        job_key = f'hydrate:{stock.symbol}'
+        status = job_queue.status(job_key)
+        if status == 'failed':
+            return jsonify({'status': 'failed', 'error': 'Could not fetch historical data'}), 200
+        if status != 'pending':
+            job_queue.submit(job_key, hydrate_stock_history, stock.id, stock.symbol)
+        return jsonify({'status': 'pending'}), 202
+    
+    return jsonify(dict(chart_series(history), status='ready'))
+
+@app.route('/api/stock/<symbol>/series')
+@login_required
+def api_stock_series(symbol):
+    stock = Stock.query.filter_by(symbol=symbol).first()
+    if not stock:
+        return jsonify({'error': 'Stock not found'}), 404
+    
+    range_key = request.args.get('range', '1y')
+    if range_key not in SERIES_RANGES:
+        return jsonify({'error': 'Unsupported range'}), 400
+    points = min(max(request.args.get('points', DEFAULT_SERIES_POINTS, type=int), 3), MAX_SERIES_POINTS)
+    method = request.args.get('method', 'lttb')
+    if method not in ('lttb', 'ohlc'):
+        return jsonify({'error': 'Unsupported method'}), 400
+    
+    end_date = datetime.now().date()
+    days = SERIES_RANGES[range_key]
+    start_date = end_date - timedelta(days=days) if days else None
+    
+    # Answer conditional requests before loading the window
+    count, first_date, last_date = get_history_summary(stock.id, start_date, end_date)
+    etag = f'{stock.id}-{range_key}-{points}-{method}-{count}-{first_date}-{last_date}'
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    history = get_history_frame(stock.id, start_date, end_date)
+    payload = {'symbol': stock.symbol, 'range': range_key, 'method': method}
+    
+    if method == 'ohlc':
+        starts, open_, high, low, close, volume = ohlc_buckets(
+            history['open_price'].to_numpy(), history['high_price'].to_numpy(),
+            history['low_price'].to_numpy(), history['close_price'].to_numpy(),
+            history['volume'].to_numpy(), points
+        )
+        payload.update({
+            'dates': history.index[starts].strftime('%Y-%m-%d').tolist(),
+            'open': open_.tolist(),
+            'high': high.tolist(),
+            'low': low.tolist(),
+            'close': close.tolist(),
+            'volume': volume.tolist()
+        })
+    else:
+        close = history['close_price'].to_numpy()
+        selected = lttb_indices(history.index.to_julian_date().to_numpy(), close, points)
+        payload.update({
+            'dates': history.index[selected].strftime('%Y-%m-%d').tolist(),
+            'close': close[selected].tolist(),
+            'volume': history['volume'].to_numpy()[selected].tolist()
+        })
+    
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=60'
+    return response
+
+@app.route('/api/stock-prices')
+@login_required
+def api_stock_prices():
+    symbols = [symbol.strip() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()]
+    if not symbols:
+        return jsonify({'error': 'No symbols given'}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols per request'}), 400
+    
+    try:
+        return jsonify({'prices': get_stock_prices(symbols)})
+    except Exception as e:
+        logger.error(f"Error getting stock prices: {e}")
+        return jsonify({'error': 'Failed to get stock prices'}), 500
+
+@app.route('/api/cache/stats')
+@login_required
+def api_cache_stats():
+    return jsonify({
+        'quotes': quote_cache.stats(),
+        'recommendations': recommendation_cache.stats(),
+        'news': news_service.cache_stats()
+    })
+
 @app.route('/api/portfolio-performance')
 @login_required
 def api_portfolio_performance():
@@ -706,7 +733,15 @@ def api_portfolio_performance():
         if not portfolio:
             return jsonify({'error': 'No portfolio found'}), 404
         
-        performance_data = calculate_portfolio_performance(portfolio.id)
+        # Optional ?range=1y&points=52; omitting points gives daily resolution for the range
+        days = PERFORMANCE_RANGES.get(request.args.get('range', '1m'))
+        if days is None:
+            return jsonify({'error': 'Unsupported range'}), 400
+        points = request.args.get('points', type=int)
+        if points is None and 'range' not in request.args:
+            points = 7
+        
+        performance_data = calculate_portfolio_performance(portfolio.id, days=days, points=points)
         return jsonify(performance_data)
     except Exception as e:
         logger.error(f"Error getting portfolio performance: {e}")
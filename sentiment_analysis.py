@@ -1,11 +1,24 @@
 import logging
+import os
 import nltk
 import re
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from collections import Counter
 
 logger = logging.getLogger(__name__)
 
+# Cleaning patterns, compiled once instead of on every call
+URL_PATTERN = re.compile(r'http\S+|www\S+|https\S+')
+NON_WORD_PATTERN = re.compile(r'\W+')
+
+# Distinct texts below which a batch is scored in-process; pool startup costs more than it saves
+PARALLEL_THRESHOLD = 2000
+
+# Texts per task sent to a pool worker
+PARALLEL_CHUNK_SIZE = 500
+
 # Download NLTK resources (first time only)
 try:
     nltk.data.find('vader_lexicon')
@@ -68,16 +81,8 @@ financial_lexicon = {
 for word, score in financial_lexicon.items():
     sia.lexicon[word] = score
 
-def analyze_sentiment(text):
-    """
-    Analyze the sentiment of text
-    
-    Args:
-        text (str): Text to analyze
-        
-    Returns:
-        float: Sentiment score (-1 to 1 where -1 is very negative, 1 is very positive)
-    """
+def _score_text(text):
+    """Compound VADER score of cleaned text; 0.0 for empty text or on error"""
     try:
         if not text:
             return 0.0
@@ -85,16 +90,67 @@ def analyze_sentiment(text):
         # Clean text (remove URLs, special characters, etc.)
         clean_text = clean_text_for_sentiment(text)
         
-        # Get sentiment scores
-        scores = sia.polarity_scores(clean_text)
-        
         # Return compound score
-        return scores['compound']
+        return sia.polarity_scores(clean_text)['compound']
     
     except Exception as e:
         logger.error(f"Error analyzing sentiment: {e}")
         return 0.0
 
+def _score_chunk(texts):
+    """Pool worker entry point; each worker process has its own analyzer from module import"""
+    return [_score_text(text) for text in texts]
+
+def analyze_sentiment(text):
+    """
+    Analyze the sentiment of text
+    
+    Args:
+        text (str): Text to analyze
+        
+    Returns:
+        float: Sentiment score (-1 to 1 where -1 is very negative, 1 is very positive)
+    """
+    return _score_text(text)
+
+def analyze_sentiment_batch(texts, workers=None):
+    """
+    Analyze the sentiment of many texts at once
+    
+    Identical texts are scored once. Batches with at least PARALLEL_THRESHOLD
+    distinct texts are spread over a process pool, since VADER is pure Python
+    and holds the GIL.
+    
+    Args:
+        texts (iterable): Texts to analyze; None and empty strings score 0.0
+        workers (int): Pool size (CPU count if None); 1 always scores in-process
+        
+    Returns:
+        np.ndarray: float64 sentiment scores aligned with texts
+    """
+    texts = list(texts)
+    unique_texts = list(dict.fromkeys(text for text in texts if text))
+    if not unique_texts:
+        return np.zeros(len(texts))
+    
+    workers = workers or os.cpu_count() or 1
+    scores = None
+    if workers > 1 and len(unique_texts) >= PARALLEL_THRESHOLD:
+        chunks = [
+            unique_texts[start:start + PARALLEL_CHUNK_SIZE]
+            for start in range(0, len(unique_texts), PARALLEL_CHUNK_SIZE)
+        ]
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+                scores = [score for chunk in pool.map(_score_chunk, chunks) for score in chunk]
+        except Exception as e:
+            logger.error(f"Error scoring sentiment in parallel, falling back to one process: {e}")
+    if scores is None:
+        scores = _score_chunk(unique_texts)
+    
+    score_of = dict(zip(unique_texts, scores))
+    return np.fromiter((score_of.get(text, 0.0) for text in texts), dtype=np.float64, count=len(texts))
+
 def clean_text_for_sentiment(text):
     """
     Clean text for sentiment analysis
@@ -106,15 +162,10 @@ def clean_text_for_sentiment(text):
         str: Cleaned text
     """
     # Remove URLs
-    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-    
-    # Remove special characters and digits
-    text = re.sub(r'\W', ' ', text)
-    
-    # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = URL_PATTERN.sub('', text)
     
-    return text
+    # Replace runs of special characters and whitespace with a single space
+    return NON_WORD_PATTERN.sub(' ', text).strip()
 
 def extract_keywords(text, top_n=5):
     """
@@ -181,3 +232,57 @@ def get_entity_sentiment(text, entity):
     except Exception as e:
         logger.error(f"Error analyzing entity sentiment: {e}")
         return 0.0
+
+
+def benchmark(n_texts=10000, duplicate_rate=0.1, seed=0):
+    """
+    Compare per-text scoring with analyze_sentiment_batch on synthetic headlines
+    
+    Args:
+        n_texts (int): Number of headlines
+        duplicate_rate (float): Share of headlines repeating an earlier one, as syndicated stories do
+        seed (int): Random seed
+        
+    Returns:
+        dict: Texts per second for each method
+    """
+    import random
+    import time
+    
+    rng = random.Random(seed)
+    companies = ['Apple', 'Microsoft', 'Tesla', 'Exxon', 'Pfizer', 'JPMorgan', 'Walmart', 'Nvidia', 'Boeing', 'Intel']
+    events = list(financial_lexicon) + ['reports', 'announces', 'expects', 'reviews', 'holds', 'plans']
+    headlines = []
+    for i in range(n_texts):
+        if headlines and rng.random() < duplicate_rate:
+            headlines.append(rng.choice(headlines))
+            continue
+        headlines.append(
+            f"{rng.choice(companies)} {rng.choice(events)} {rng.choice(events)} as Q{rng.randint(1, 4)} "
+            f"revenue moves {rng.uniform(-20, 20):.1f}% - https://news.example.com/{i}?utm_source=feed"
+        )
+    
+    timings = {}
+    start = time.perf_counter()
+    expected = np.array([analyze_sentiment(text) for text in headlines])
+    timings['per_text'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    serial = analyze_sentiment_batch(headlines, workers=1)
+    timings['batch'] = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    parallel = analyze_sentiment_batch(headlines)
+    timings['batch_parallel'] = time.perf_counter() - start
+    
+    assert np.array_equal(expected, serial) and np.array_equal(expected, parallel)
+    
+    results = {name: n_texts / seconds for name, seconds in timings.items()}
+    for name, rate in results.items():
+        print(f"{name:>15}: {rate:9.0f} texts/s ({timings[name] * 1000:.0f} ms)")
+    print(f"{os.cpu_count()} CPUs, {len(set(headlines))} distinct of {n_texts} headlines")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -24,6 +24,7 @@ nltk.download('stopwords')
 from app import app, db
 from models import User, UserPreference, Portfolio, Stock, PortfolioItem, News, Recommendation, RealEstate, Cryptocurrency
 from werkzeug.security import generate_password_hash
+from news_ingest import url_hash
 
 def create_tables():
     """Create all database tables"""
@@ -302,6 +303,7 @@ def add_sample_data():
                 news = News(
                     title=news_data["title"],
                     url=news_data["url"],
+                    url_hash=url_hash(news_data["url"]),
                     source=news_data["source"],
                     published_at=news_data["published_at"],
                     summary=news_data["summary"],
@@ -0,0 +1,373 @@
+"""
+Pluggable cosine-similarity indexes for the recommender.
+
+Both backends hold unit-normalised vectors keyed by stock ID and support
+incremental add/remove so the index can follow Stock inserts and deletes
+without a full rebuild:
+
+- ExactIndex scores every vector with one matrix multiply and selects the
+  top k with argpartition.
+- IVFIndex clusters vectors into k-means lists and only scores the lists
+  whose centroids are closest to the query, so a query touches a fraction
+  of the universe as it grows.
+
+Run this module to benchmark IVF recall against the exact backend:
+
+    python similarity_index.py
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Compact storage once this fraction of rows are deleted
+COMPACT_RATIO = 0.5
+
+def _normalise(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class _VectorStore:
+    """Growable row storage with tombstoned deletes shared by the index backends"""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._vectors = np.empty((0, dim), dtype=np.float64)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._size = 0
+        self._row_of = {}
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, item_id):
+        return item_id in self._row_of
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids), 16)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float64)
+        ids = np.full(capacity, -1, dtype=np.int64)
+        alive = np.zeros(capacity, dtype=bool)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._ids, self._alive = vectors, ids, alive
+
+    def add(self, ids, vectors):
+        """
+        Insert vectors, replacing any existing entries with the same IDs
+
+        Args:
+            ids (list): Item IDs
+            vectors (np.ndarray): One vector per ID
+        """
+        ids = [int(item_id) for item_id in ids]
+        if not ids:
+            return
+        self.remove([item_id for item_id in ids if item_id in self._row_of])
+
+        vectors = _normalise(vectors)
+        self._reserve(len(ids))
+        rows = np.arange(self._size, self._size + len(ids))
+        self._vectors[rows] = vectors
+        self._ids[rows] = ids
+        self._alive[rows] = True
+        self._size += len(ids)
+        self._row_of.update(zip(ids, rows.tolist()))
+        self._on_add(rows)
+
+    def remove(self, ids):
+        """Delete vectors by ID, ignoring unknown IDs"""
+        rows = [self._row_of.pop(int(item_id)) for item_id in ids if int(item_id) in self._row_of]
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype=np.int64)
+        self._alive[rows] = False
+        self._on_remove(rows)
+
+        if self._size and (self._size - len(self._row_of)) / self._size > COMPACT_RATIO:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = self._vectors[keep].copy()
+        self._ids = self._ids[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._size = len(keep)
+        self._row_of = {item_id: row for row, item_id in enumerate(self._ids.tolist())}
+        self._on_compact()
+
+    def _excluded_rows(self, exclude_ids):
+        return [self._row_of[item_id] for item_id in exclude_ids if item_id in self._row_of]
+
+    def _top_k(self, scores, rows, k):
+        """Best k (ids, scores) among candidate rows, padded with -1 / -inf"""
+        ids = np.full(k, -1, dtype=np.int64)
+        top_scores = np.full(k, -np.inf)
+        finite = np.isfinite(scores)
+        scores, rows = scores[finite], rows[finite]
+        n = min(k, len(scores))
+        if n == 0:
+            return ids, top_scores
+        top = np.argpartition(-scores, n - 1)[:n] if len(scores) > n else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        ids[:n] = self._ids[rows[top]]
+        top_scores[:n] = scores[top]
+        return ids, top_scores
+
+    def search(self, query, k, exclude_ids=()):
+        """
+        Most similar items to a query vector
+
+        Args:
+            query (np.ndarray): Query vector
+            k (int): Number of results
+            exclude_ids (iterable): Item IDs to leave out
+
+        Returns:
+            tuple: (ids, scores) arrays, best first
+        """
+        ids, scores = self.search_many(np.atleast_2d(query), k, [exclude_ids])
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+    def _on_add(self, rows):
+        pass
+
+    def _on_remove(self, rows):
+        pass
+
+    def _on_compact(self):
+        pass
+
+class ExactIndex(_VectorStore):
+    """Brute-force cosine similarity over every stored vector"""
+
+    def search_many(self, queries, k, exclude_ids=None):
+        """
+        Exact top k for many queries with one matrix multiply
+
+        Args:
+            queries (np.ndarray): One query vector per row
+            k (int): Results per query
+            exclude_ids (list): Per-query iterables of item IDs to leave out
+
+        Returns:
+            tuple: (ids, scores) arrays of shape (queries, k), best first, padded with -1 / -inf
+        """
+        queries = _normalise(queries)
+        n = queries.shape[0]
+        ids = np.full((n, k), -1, dtype=np.int64)
+        scores = np.full((n, k), -np.inf)
+        if self._size == 0 or k == 0:
+            return ids, scores
+
+        all_scores = queries @ self._vectors[:self._size].T
+        all_scores[:, ~self._alive[:self._size]] = -np.inf
+        if exclude_ids:
+            rows, cols = [], []
+            for i, excluded in enumerate(exclude_ids):
+                excluded_rows = self._excluded_rows(excluded)
+                rows.extend([i] * len(excluded_rows))
+                cols.extend(excluded_rows)
+            all_scores[rows, cols] = -np.inf
+
+        n_top = min(k, self._size)
+        if n_top < self._size:
+            top = np.argpartition(-all_scores, n_top - 1, axis=1)[:, :n_top]
+        else:
+            top = np.broadcast_to(np.arange(self._size), (n, self._size))
+        top_scores = np.take_along_axis(all_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        finite = np.isfinite(top_scores)
+        ids[:, :n_top] = np.where(finite, self._ids[top], -1)
+        scores[:, :n_top] = top_scores
+        return ids, scores
+
+class IVFIndex(_VectorStore):
+    """Inverted-file index: k-means lists over the vectors, queries only score the closest lists"""
+
+    def __init__(self, dim, n_lists=None, n_probe=16, iterations=10, seed=0):
+        """
+        Args:
+            dim (int): Vector dimension
+            n_lists (int): Number of k-means lists, about sqrt(n) / 4 if None
+            n_probe (int): Lists scored per query; more lists raise recall and query cost
+            iterations (int): k-means iterations when (re)training
+            seed (int): Seed for centroid initialisation
+        """
+        super().__init__(dim)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self._rng = np.random.default_rng(seed)
+        self._centroids = np.empty((0, dim), dtype=np.float64)
+        # Rows grouped by list: rows of list l are _list_rows[_offsets[l]:_offsets[l + 1]]
+        self._list_rows = np.empty(0, dtype=np.int64)
+        self._list_vectors = np.empty((0, dim), dtype=np.float64)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        # Rows added since the last training; always scored until the next retrain folds them in
+        self._pending = []
+        self._trained_size = 0
+
+    def _assign(self, vectors, chunk_size=8192):
+        """Nearest centroid of each vector by cosine similarity"""
+        if not len(vectors):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk_size] @ self._centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk_size)
+        ])
+
+    def train(self):
+        """Fit spherical k-means on the live vectors and rebuild the inverted lists"""
+        rows = np.flatnonzero(self._alive[:self._size])
+        self._pending = []
+        self._trained_size = rows.size
+        if rows.size == 0:
+            self._centroids = np.empty((0, self.dim), dtype=np.float64)
+            self._list_rows = np.empty(0, dtype=np.int64)
+            self._list_vectors = np.empty((0, self.dim), dtype=np.float64)
+            self._offsets = np.zeros(1, dtype=np.int64)
+            return
+
+        vectors = self._vectors[rows]
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(rows.size) / 4)), rows.size)
+
+        self._centroids = vectors[self._rng.choice(rows.size, n_lists, replace=False)]
+        for _ in range(self.iterations):
+            assignment = self._assign(vectors)
+            sums = np.zeros_like(self._centroids)
+            np.add.at(sums, assignment, vectors)
+            # Re-seed empty lists from random vectors
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = vectors[self._rng.choice(rows.size, int(empty.sum()))]
+            self._centroids = _normalise(sums)
+
+        assignment = self._assign(vectors)
+        order = np.argsort(assignment, kind='stable')
+        self._list_rows = rows[order]
+        # Vectors stored in list order so a probed list is a contiguous slice, not a gather
+        self._list_vectors = vectors[order]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+
+    def _on_add(self, rows):
+        self._pending.extend(rows.tolist())
+        # Retrain once the unindexed rows are a sizeable share of the index
+        if len(self._pending) > max(1000, self._trained_size // 10) or self._trained_size == 0:
+            self.train()
+
+    def _on_compact(self):
+        self.train()
+
+    def search_many(self, queries, k, exclude_ids=None):
+        """
+        Approximate top k for many queries; same contract as ExactIndex.search_many
+
+        Queries whose probed lists hold fewer than k candidates fall back to an
+        exact scan so callers always get k results when k items exist.
+        """
+        queries = _normalise(queries)
+        n = queries.shape[0]
+        ids = np.full((n, k), -1, dtype=np.int64)
+        scores = np.full((n, k), -np.inf)
+        if self._size == 0 or k == 0:
+            return ids, scores
+
+        pending = np.asarray(self._pending, dtype=np.int64)
+        n_probe = min(self.n_probe, len(self._centroids))
+        probes = np.empty((n, 0), dtype=np.int64)
+        if n_probe:
+            probes = np.argpartition(-(queries @ self._centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        alive = self._alive[:self._size]
+        pending_vectors = self._vectors[pending]
+        for i in range(n):
+            query = queries[i]
+            spans = [(self._offsets[l], self._offsets[l + 1]) for l in probes[i].tolist()]
+            rows = np.concatenate([self._list_rows[a:b] for a, b in spans] + [pending])
+            candidate_scores = np.concatenate([self._list_vectors[a:b] @ query for a, b in spans] + [pending_vectors @ query])
+
+            excluded = self._excluded_rows(exclude_ids[i]) if exclude_ids and exclude_ids[i] else []
+            keep = alive[rows] & ~np.isin(rows, excluded)
+            if np.count_nonzero(keep) < k:
+                rows = np.flatnonzero(alive)
+                keep = ~np.isin(rows, excluded)
+                candidate_scores = self._vectors[rows] @ query
+            ids[i], scores[i] = self._top_k(candidate_scores[keep], rows[keep], k)
+        return ids, scores
+
+INDEX_BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex
+}
+
+def create_index(dim, backend=None):
+    """
+    Build an empty index for the configured backend
+
+    Args:
+        dim (int): Vector dimension
+        backend (str): 'exact' or 'ivf', read from RECOMMENDATION_INDEX if None
+
+    Returns:
+        ExactIndex or IVFIndex: Empty index
+    """
+    backend = backend or os.environ.get('RECOMMENDATION_INDEX', 'exact')
+    if backend not in INDEX_BACKENDS:
+        logger.warning(f"Unknown recommendation index '{backend}', using exact")
+        backend = 'exact'
+    return INDEX_BACKENDS[backend](dim)
+
+def benchmark(n_items=50000, n_sectors=13, n_markets=6, n_queries=200, k=20, seed=0):
+    """
+    Recall@k and query latency of IVFIndex against ExactIndex on recommender-shaped vectors
+
+    Returns:
+        dict: Build and query timings for both backends and the mean IVF recall
+    """
+    rng = np.random.default_rng(seed)
+    numeric = rng.standard_normal((n_items, 3))
+    sectors = np.eye(n_sectors)[rng.integers(0, n_sectors, n_items)]
+    markets = np.eye(n_markets)[rng.integers(0, n_markets, n_items)]
+    vectors = np.hstack([numeric, sectors, markets])
+    ids = np.arange(1, n_items + 1)
+
+    queries = np.hstack([
+        rng.uniform(-1, 1, (n_queries, 3)),
+        rng.integers(0, 2, (n_queries, n_sectors)),
+        rng.integers(0, 2, (n_queries, n_markets))
+    ]).astype(np.float64)
+
+    results = {}
+    found = {}
+    for name, cls in INDEX_BACKENDS.items():
+        index = cls(vectors.shape[1])
+        start = time.perf_counter()
+        index.add(ids, vectors)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found[name], _ = index.search_many(queries, k)
+        query = (time.perf_counter() - start) / n_queries
+        results[name] = {'build_s': round(build, 3), 'query_ms': round(query * 1000, 3)}
+
+    hits = [len(set(exact) & set(approx)) / k for exact, approx in zip(found['exact'], found['ivf'])]
+    results['ivf']['recall'] = round(float(np.mean(hits)), 3)
+    return results
+
+if __name__ == "__main__":
+    for n_items in (10000, 50000, 200000):
+        print(n_items, benchmark(n_items=n_items))
@@ -0,0 +1,162 @@
+"""
+Nightly feature computation for the recommender.
+
+Derives realized volatility, average dollar volume, momentum and maximum
+drawdown for every stock at once from the days x stocks price matrix and
+upserts them into the stock_features table, so recommendation requests read
+one row per stock instead of inventing features.
+
+Run manually with:
+
+    python stock_features.py
+"""
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from app import app, db
+from models import StockFeatures
+from price_store import PriceStore
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Trading-day windows for each feature
+VOLATILITY_WINDOW = 252
+DOLLAR_VOLUME_WINDOW = 20
+MOMENTUM_WINDOW = 126
+DRAWDOWN_WINDOW = 252
+
+# Stocks with fewer daily returns than this get no volatility
+MIN_OBSERVATIONS = 20
+
+# Calendar days of history to load, enough to cover the longest window
+LOOKBACK_DAYS = 400
+
+BATCH_SIZE = 5000
+
+def _forward_fill(matrix):
+    """Carry the last non-NaN value down each column"""
+    valid = ~np.isnan(matrix)
+    rows = np.where(valid, np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(matrix, rows, axis=0)
+
+def compute_features(closes, volumes):
+    """
+    Compute features for every column of a price matrix
+
+    Args:
+        closes (np.ndarray): Days x stocks closes, NaN where a stock has no row that day
+        volumes (np.ndarray): Days x stocks volumes aligned with closes
+
+    Returns:
+        dict: Arrays of length n_stocks keyed by StockFeatures column name
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    observed = ~np.isnan(closes)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Realized volatility from daily log returns between consecutive observed days
+        window = closes[-(VOLATILITY_WINDOW + 1):]
+        log_prices = np.log(np.where(window > 0, window, np.nan))
+        returns = np.diff(_forward_fill(log_prices), axis=0)
+        returns[~observed[-returns.shape[0]:]] = np.nan
+        observations = np.count_nonzero(~np.isnan(returns), axis=0)
+        volatility = np.full(closes.shape[1], np.nan)
+        enough = observations >= MIN_OBSERVATIONS
+        if enough.any():
+            volatility[enough] = np.nanstd(returns[:, enough], axis=0, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+        # Average dollar volume over the days each stock actually traded
+        dollar_volume = np.where(observed, closes * volumes, np.nan)[-DOLLAR_VOLUME_WINDOW:]
+        traded = np.count_nonzero(~np.isnan(dollar_volume), axis=0)
+        avg_dollar_volume = np.where(traded > 0, np.nansum(dollar_volume, axis=0) / np.maximum(traded, 1), np.nan)
+
+        # Momentum: last close against the first close inside the window
+        filled = _forward_fill(closes)
+        momentum_window = filled[-(MOMENTUM_WINDOW + 1):]
+        first = momentum_window[np.argmax(~np.isnan(momentum_window), axis=0), np.arange(closes.shape[1])]
+        momentum = filled[-1] / first - 1
+
+        # Maximum drawdown from the running peak
+        drawdown_window = filled[-DRAWDOWN_WINDOW:]
+        peaks = np.fmax.accumulate(drawdown_window, axis=0)
+        max_drawdown = np.nanmin(drawdown_window / peaks - 1, axis=0)
+
+    return {
+        'volatility': volatility,
+        'avg_dollar_volume': avg_dollar_volume,
+        'momentum': momentum,
+        'max_drawdown': max_drawdown,
+        'observations': observations
+    }
+
+def _nullable(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+def update_stock_features(store=None):
+    """
+    Recompute and upsert features for every stock with history
+
+    Args:
+        store (PriceStore): Price matrix to compute from; the last LOOKBACK_DAYS are loaded if None
+
+    Returns:
+        int: Number of stocks whose features were written
+    """
+    try:
+        if store is None:
+            store = PriceStore()
+            store.load_from_db(since=datetime.now().date() - timedelta(days=LOOKBACK_DAYS))
+        if not store.loaded:
+            logger.info("No stock history to compute features from")
+            return 0
+
+        features = compute_features(store.closes, store.volumes)
+
+        # Last observed trading day per stock
+        observed = ~np.isnan(np.asarray(store.closes))
+        last_rows = observed.shape[0] - 1 - np.argmax(observed[::-1], axis=0)
+
+        now = datetime.utcnow()
+        rows = [
+            {
+                'stock_id': int(stock_id),
+                'as_of': store.calendar[last_rows[col]].item(),
+                'volatility': _nullable(features['volatility'][col]),
+                'avg_dollar_volume': _nullable(features['avg_dollar_volume'][col]),
+                'momentum': _nullable(features['momentum'][col]),
+                'max_drawdown': _nullable(features['max_drawdown'][col]),
+                'observations': int(features['observations'][col]),
+                'computed_at': now
+            }
+            for col, stock_id in enumerate(store.stock_ids.tolist())
+        ]
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            stmt = insert(StockFeatures).values(rows[start:start + BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['stock_id'],
+                set_={column: stmt.excluded[column] for column in rows[0] if column != 'stock_id'}
+            )
+            db.session.execute(stmt)
+        db.session.commit()
+
+        logger.info(f"Computed features for {len(rows)} stocks")
+        return len(rows)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error computing stock features: {e}")
+        return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    with app.app_context():
+        update_stock_features()
@@ -0,0 +1,70 @@
+"""
+Shared fixtures.
+
+The models use PostgreSQL-only column types and app.py creates tables when it is
+imported, so tests that touch the database need a scratch PostgreSQL database in
+TEST_DATABASE_URL. Its tables are dropped and recreated for every test; those
+tests are skipped when the variable is not set.
+"""
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Scripts in utils/ import each other by module name
+sys.path.append(os.path.join(ROOT, 'utils'))
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    # app.py reads DATABASE_URL at import time
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from app import app as flask_app
+    return flask_app
+
+@pytest.fixture
+def db(app):
+    """Empty schema inside an application context"""
+    from app import db as database
+    with app.app_context():
+        database.drop_all()
+        database.create_all()
+        yield database
+        database.session.remove()
+
+@pytest.fixture
+def count_queries(db):
+    """
+    Context manager that counts SQL statements sent to the database
+
+    Usage:
+        with count_queries() as queries:
+            ...
+        assert queries.count == 2
+    """
+    from sqlalchemy import event
+
+    class Counter:
+        count = 0
+
+    @contextmanager
+    def counting():
+        counter = Counter()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            counter.count += 1
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counting
@@ -0,0 +1,116 @@
+"""BackfillScheduler against a local stand-in for the Alpha Vantage API"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pytest
+
+import historical_data_fetcher_av as av
+from backfill_scheduler import BackfillScheduler
+from rate_limiter import SharedBudget
+
+SYMBOLS = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+
+
+def daily_series(days=5):
+    """TIME_SERIES_DAILY payload, most recent day first like the real API"""
+    dates = pd.bdate_range(end='2024-06-28', periods=days)[::-1]
+    return {
+        'Meta Data': {},
+        'Time Series (Daily)': {
+            day.strftime('%Y-%m-%d'): {
+                '1. open': '10.0', '2. high': '11.0', '3. low': '9.0', '4. close': '10.5', '5. volume': '1000'
+            }
+            for day in dates
+        }
+    }
+
+
+@pytest.fixture
+def alpha_vantage(monkeypatch):
+    """Stand-in server on a free local port; yields the (time, symbol) of every request it served"""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = parse_qs(urlsplit(self.path).query)
+            calls.append((time.time(), params['symbol'][0]))
+            body = json.dumps(daily_series()).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(av, 'BASE_URL', f'http://127.0.0.1:{server.server_port}/query')
+    monkeypatch.setenv('ALPHA_VANTAGE_API_KEY', 'test')
+    yield calls
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def budgets(monkeypatch, tmp_path):
+    """Swap in budgets with their own counter files: budgets(per_window, window_seconds, daily)"""
+    def use(per_window, window, daily, name='daily'):
+        monkeypatch.setattr(av, 'api_minute_budget',
+                            SharedBudget('minute', per_window, period=window, path=str(tmp_path / 'minute.json')))
+        monkeypatch.setattr(av, 'api_budget', SharedBudget(name, daily, path=str(tmp_path / f'{name}.json')))
+    return use
+
+
+@pytest.fixture
+def stocks(db):
+    from models import Stock
+
+    db.session.add_all([Stock(symbol=symbol, name=f'{symbol} Inc') for symbol in SYMBOLS])
+    db.session.commit()
+
+
+def test_minute_limit_makes_extra_calls_wait(alpha_vantage, budgets, stocks, tmp_path):
+    # 2 calls per 1-second window, so 5 symbols need at least three windows
+    budgets(per_window=2, window=1, daily=100)
+    started = time.time()
+
+    results = BackfillScheduler(workers=4, progress_file=str(tmp_path / 'progress.json')).run(SYMBOLS)
+
+    assert results == {symbol: True for symbol in SYMBOLS}
+    assert sorted(symbol for _, symbol in alpha_vantage) == SYMBOLS
+    last_call = max(at for at, _ in alpha_vantage)
+    assert int(last_call) - int(started) >= 2
+
+
+def test_exhausted_budget_stops_run_and_resume_skips_done_symbols(alpha_vantage, budgets, stocks, db, tmp_path):
+    from models import StockHistory
+
+    progress_file = str(tmp_path / 'progress.json')
+    budgets(per_window=100, window=60, daily=3)
+
+    first = BackfillScheduler(workers=4, progress_file=progress_file).run(SYMBOLS)
+
+    done = sorted(symbol for symbol, ok in first.items() if ok)
+    assert len(done) == 3
+    assert sorted(symbol for _, symbol in alpha_vantage) == done
+    # The checkpoint survives so the run can be resumed
+    with open(progress_file) as f:
+        assert sorted(symbol for symbol, ok in json.load(f)['results'].items() if ok) == done
+
+    # Next day's quota: the same run resumes and fetches only what it has not stored
+    budgets(per_window=100, window=60, daily=3, name='next_day')
+    alpha_vantage.clear()
+
+    second = BackfillScheduler(workers=4, progress_file=progress_file).run(SYMBOLS)
+
+    assert second == {symbol: True for symbol in SYMBOLS}
+    assert sorted(symbol for _, symbol in alpha_vantage) == sorted(set(SYMBOLS) - set(done))
+    assert not os.path.exists(progress_file)
+    assert StockHistory.query.count() == 5 * len(SYMBOLS)
@@ -0,0 +1,17 @@
+"""Quote lookups count one hit or miss per call"""
+import data_fetcher
+
+
+def test_single_symbol_price_lookups_count_once(monkeypatch):
+    monkeypatch.setattr(data_fetcher, 'quote_cache', data_fetcher.TTLCache('quotes', ttl=60))
+    monkeypatch.setattr(data_fetcher.yf, 'Ticker',
+                        lambda symbol: type('Ticker', (), {'info': {'regularMarketPrice': 1.0}})())
+
+    for _ in range(10):
+        data_fetcher.get_stock_price('aapl')
+    # Priced by a batch fetch
+    data_fetcher.quote_cache.set('price:MSFT', {'symbol': 'MSFT', 'price': 2.0})
+    data_fetcher.get_stock_price('msft')
+
+    stats = data_fetcher.quote_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['loads']) == (10, 1, 1)
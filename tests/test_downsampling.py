@@ -0,0 +1,89 @@
+"""Chart downsampling keeps the points and bars a chart needs"""
+import numpy as np
+import pytest
+
+from downsampling import lttb_indices, ohlc_buckets
+
+
+def random_walk(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), 100 + rng.normal(0, 1, n).cumsum()
+
+
+@pytest.mark.parametrize('n, points', [(1000, 100), (1000, 3), (101, 100), (5000, 250)])
+def test_lttb_keeps_endpoints_and_returns_requested_length(n, points):
+    x, y = random_walk(n)
+
+    selected = lttb_indices(x, y, points)
+
+    assert len(selected) == points
+    assert selected[0] == 0
+    assert selected[-1] == n - 1
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_picks_one_point_per_bucket():
+    x, y = random_walk(1000)
+    points = 50
+
+    selected = lttb_indices(x, y, points)
+
+    every = (len(y) - 2) / (points - 2)
+    for i, index in enumerate(selected[1:-1]):
+        assert int(i * every) + 1 <= index < int((i + 1) * every) + 1
+
+
+def test_lttb_keeps_a_lone_spike():
+    x, y = random_walk(1000)
+    y[500] += 1000
+
+    assert 500 in lttb_indices(x, y, 50)
+
+
+@pytest.mark.parametrize('n, points', [(10, 10), (10, 50), (10, 2), (0, 100)])
+def test_lttb_returns_short_inputs_unchanged(n, points):
+    x, y = random_walk(n)
+
+    np.testing.assert_array_equal(lttb_indices(x, y, points), np.arange(n))
+
+
+def test_ohlc_buckets_keep_each_buckets_open_high_low_close():
+    rng = np.random.default_rng(1)
+    n, points = 103, 10
+    close = 100 + rng.normal(0, 1, n).cumsum()
+    open_ = close + rng.normal(0, 0.5, n)
+    high = np.maximum(open_, close) + rng.uniform(0, 1, n)
+    low = np.minimum(open_, close) - rng.uniform(0, 1, n)
+    volume = rng.integers(1, 1000, n)
+
+    starts, o, h, l, c, v = ohlc_buckets(open_, high, low, close, volume, points)
+
+    assert len(starts) == points
+    assert starts[0] == 0
+    ends = np.r_[starts[1:], n]
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        assert o[i] == open_[start]
+        assert h[i] == high[start:end].max()
+        assert l[i] == low[start:end].min()
+        assert c[i] == close[end - 1]
+        assert v[i] == volume[start:end].sum()
+    assert v.sum() == volume.sum()
+
+
+def test_ohlc_buckets_with_fewer_rows_than_points_are_the_rows():
+    values = np.arange(5, dtype=np.float64)
+
+    starts, o, h, l, c, v = ohlc_buckets(values, values + 1, values - 1, values + 0.5, values, 20)
+
+    np.testing.assert_array_equal(starts, np.arange(5))
+    np.testing.assert_array_equal(o, values)
+    np.testing.assert_array_equal(c, values + 0.5)
+
+
+def test_ohlc_buckets_of_nothing_are_empty():
+    empty = np.empty(0)
+
+    starts, *columns = ohlc_buckets(empty, empty, empty, empty, empty, 10)
+
+    assert len(starts) == 0
+    assert all(len(column) == 0 for column in columns)
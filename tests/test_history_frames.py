@@ -0,0 +1,69 @@
+"""Columnar history helpers match the dict-of-dicts output they replaced"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_fetcher import history_to_frame
+
+
+def yfinance_history(tz, days=30, seed=0):
+    """Ticker.history-shaped frame: exchange-local midnight index and the yfinance columns"""
+    rng = np.random.default_rng(seed)
+    # Crosses the US daylight saving change at the start of November
+    index = pd.date_range('2024-10-21', periods=days, freq='B', tz=tz, name='Date')
+    close = 100 + rng.normal(0, 1, days).cumsum()
+    return pd.DataFrame({
+        'Open': close + rng.normal(0, 0.5, days),
+        'High': close + 1,
+        'Low': close - 1,
+        'Close': close,
+        'Volume': rng.integers(1_000, 1_000_000, days),
+        'Dividends': 0.0,
+        'Stock Splits': 0.0
+    }, index=index)
+
+
+def legacy_history_dict(hist):
+    """The previous get_stock_data(historical=True) conversion"""
+    historical_data = {}
+    for index, row in hist.iterrows():
+        date_str = index.strftime('%Y-%m-%d')
+        historical_data[date_str] = {
+            'open': row['Open'],
+            'high': row['High'],
+            'low': row['Low'],
+            'close': row['Close'],
+            'volume': row['Volume']
+        }
+    return historical_data
+
+
+@pytest.mark.parametrize('tz', ['America/New_York', 'Asia/Tokyo', None])
+def test_history_to_frame_matches_legacy_dict(tz):
+    hist = yfinance_history(tz)
+    legacy = legacy_history_dict(hist)
+
+    frame = history_to_frame(hist)
+
+    assert frame.index.name == 'date'
+    assert frame.index.tz is None
+    assert frame.index.strftime('%Y-%m-%d').tolist() == list(legacy)
+    for column, key in [('open_price', 'open'), ('high_price', 'high'), ('low_price', 'low'),
+                        ('close_price', 'close'), ('volume', 'volume')]:
+        assert frame[column].tolist() == [values[key] for values in legacy.values()]
+
+
+@pytest.mark.parametrize('tz', ['America/New_York', 'Asia/Tokyo', None])
+def test_chart_series_matches_legacy_lists(app, tz):
+    from routes import chart_series
+
+    hist = yfinance_history(tz)
+    legacy = legacy_history_dict(hist)
+
+    chart = chart_series(history_to_frame(hist))
+
+    assert chart == {
+        'dates': list(legacy),
+        'prices': [values['close'] for values in legacy.values()],
+        'volumes': [values['volume'] for values in legacy.values()]
+    }
@@ -0,0 +1,53 @@
+"""Portfolio reads stay at a constant number of queries however many holdings there are"""
+import pytest
+
+
+@pytest.fixture
+def make_portfolio(db):
+    from models import User, Portfolio, PortfolioItem, Stock, RealEstate, Cryptocurrency
+
+    def make(holdings):
+        user = User(username='investor', email='investor@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+
+        portfolio = Portfolio(user_id=user.id, name='Default Portfolio')
+        db.session.add(portfolio)
+        db.session.flush()
+
+        for i in range(holdings):
+            stock = Stock(symbol=f'STK{i}', name=f'Stock {i}', sector='Technology', current_price=10.0 + i)
+            estate = RealEstate(name=f'Property {i}', location='Springfield', property_type='residential', current_value=1000.0 + i)
+            coin = Cryptocurrency(symbol=f'CRY{i}', name=f'Coin {i}', current_price=1.0 + i)
+            db.session.add_all([stock, estate, coin])
+            db.session.flush()
+            db.session.add_all([
+                PortfolioItem(portfolio_id=portfolio.id, investment_type='stock', stock_id=stock.id,
+                              quantity=2, purchase_price=5.0),
+                PortfolioItem(portfolio_id=portfolio.id, investment_type='real_estate', real_estate_id=estate.id,
+                              quantity=1, purchase_price=900.0),
+                PortfolioItem(portfolio_id=portfolio.id, investment_type='cryptocurrency', cryptocurrency_id=coin.id,
+                              quantity=3, purchase_price=0.5)
+            ])
+        user_id = user.id
+        db.session.commit()
+        # Start from an empty identity map so nothing is served without a query
+        db.session.expunge_all()
+        return user_id
+
+    return make
+
+
+@pytest.mark.parametrize('holdings', [1, 5, 25])
+def test_portfolio_summary_query_count(make_portfolio, count_queries, holdings):
+    from portfolio_service import get_user_portfolio, summarize_portfolio
+
+    user_id = make_portfolio(holdings)
+
+    with count_queries() as queries:
+        portfolio = get_user_portfolio(user_id)
+        summary = summarize_portfolio(portfolio)
+
+    assert queries.count == 2
+    assert len(summary['items']) == 3 * holdings
@@ -0,0 +1,130 @@
+"""PriceStore lookups and snapshot files, without a database"""
+import numpy as np
+import pytest
+
+from price_store import PriceStore
+
+NAN = np.nan
+
+
+def make_store(calendar, stock_ids, closes):
+    store = PriceStore()
+    store.calendar = np.asarray(calendar, dtype='datetime64[D]')
+    store.stock_ids = np.asarray(stock_ids, dtype=np.int64)
+    store.closes = np.asarray(closes, dtype=np.float64)
+    store.volumes = np.where(np.isnan(store.closes), 0, 100).astype(np.int64)
+    store._index_columns()
+    return store
+
+
+@pytest.fixture
+def store():
+    # Stock 20 starts trading on the 3rd; stock 10 has no bar on the 4th
+    return make_store(
+        ['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05', '2024-01-08'],
+        [10, 20],
+        [[1.0, NAN],
+         [2.0, 20.0],
+         [NAN, 30.0],
+         [4.0, 40.0],
+         [5.0, 50.0]]
+    )
+
+
+def test_closes_as_of_takes_latest_close_on_or_before_each_date(store):
+    dates = ['2024-01-02', '2024-01-04', '2024-01-06', '2024-01-08', '2024-02-01']
+
+    closes = store.closes_as_of([10, 20], dates)
+
+    np.testing.assert_array_equal(closes, [
+        [1.0, NAN],   # Stock 20 has no bar yet
+        [2.0, 30.0],  # Stock 10's gap is filled from the day before
+        [4.0, 40.0],  # Weekend: Friday's close
+        [5.0, 50.0],
+        [5.0, 50.0]   # After the last day: last close
+    ])
+
+
+def test_closes_as_of_is_nan_before_a_stocks_first_bar(store):
+    closes = store.closes_as_of([20, 10], ['2023-12-29', '2024-01-02', '2024-01-03'])
+
+    np.testing.assert_array_equal(closes, [
+        [NAN, NAN],
+        [NAN, 1.0],
+        [20.0, 2.0]
+    ])
+
+
+def test_closes_as_of_unknown_stock_raises(store):
+    assert not store.has_stocks([10, 30])
+    with pytest.raises(KeyError):
+        store.closes_as_of([30], ['2024-01-05'])
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_open_round_trip(store, tmp_path, mmap):
+    path = str(tmp_path / 'prices')
+    store.save(path)
+
+    opened = PriceStore.open(path, mmap=mmap)
+
+    assert isinstance(opened.closes, np.memmap) == mmap
+    np.testing.assert_array_equal(opened.calendar, store.calendar)
+    np.testing.assert_array_equal(opened.stock_ids, store.stock_ids)
+    np.testing.assert_array_equal(opened.closes, store.closes)
+    np.testing.assert_array_equal(opened.volumes, store.volumes)
+    np.testing.assert_array_equal(
+        opened.closes_as_of([10, 20], ['2024-01-06']), store.closes_as_of([10, 20], ['2024-01-06'])
+    )
+
+
+def newer_snapshot(store):
+    """The next day's snapshot: one more day and one more stock"""
+    closes = np.vstack([np.asarray(store.closes), [[6.0, 60.0]]])
+    closes = np.hstack([closes, np.full((closes.shape[0], 1), 7.0)])
+    return make_store(np.append(store.calendar, np.datetime64('2024-01-09')), [10, 20, 30], closes)
+
+
+def test_swap_leaves_open_readers_on_their_snapshot(store, tmp_path):
+    path = str(tmp_path / 'prices')
+    store.save(path)
+    reader = PriceStore.open(path)
+
+    newer_snapshot(store).save(path)
+
+    # The mapped files were swapped out and deleted but still read the old snapshot
+    assert reader.closes.shape == (5, 2)
+    np.testing.assert_array_equal(reader.closes, store.closes)
+    np.testing.assert_array_equal(reader.closes_as_of([10, 20], ['2024-01-09']), [[5.0, 50.0]])
+    # New readers see the new snapshot
+    np.testing.assert_array_equal(PriceStore.open(path).closes_as_of([10, 30], ['2024-01-09']), [[6.0, 7.0]])
+
+
+@pytest.mark.parametrize('swap_after, expected', [
+    # Old directory already removed when the remaining files are opened: start over on the new one
+    ('calendar.npy', 'newer'),
+    # Every file already open: the old snapshot stays readable
+    ('volumes.npy', 'older')
+])
+def test_swap_during_open_never_mixes_snapshots(store, tmp_path, monkeypatch, swap_after, expected):
+    path = str(tmp_path / 'prices')
+    store.save(path)
+    snapshots = {'older': store, 'newer': newer_snapshot(store)}
+    load_array = PriceStore._load_array
+    swapped = []
+
+    def load_then_swap(dir_fd, name, mmap):
+        array = load_array(dir_fd, name, mmap)
+        if name == swap_after and not swapped:
+            snapshots['newer'].save(path)
+            swapped.append(name)
+        return array
+
+    monkeypatch.setattr(PriceStore, '_load_array', staticmethod(load_then_swap))
+    opened = PriceStore.open(path)
+
+    assert swapped
+    assert opened.closes.shape == (len(opened.calendar), len(opened.stock_ids))
+    np.testing.assert_array_equal(opened.calendar, snapshots[expected].calendar)
+    np.testing.assert_array_equal(opened.closes, snapshots[expected].closes)
+    np.testing.assert_array_equal(opened.volumes, snapshots[expected].volumes)
@@ -0,0 +1,54 @@
+"""save_recommendations only writes rows whose stock or score changed"""
+from recommendation_diff import diff_rankings
+
+
+def test_unchanged_rankings_write_nothing():
+    stored = {1: {10: (100, 0.9), 11: (101, 0.5)}}
+
+    upserts, deletes, counts = diff_rankings(stored, {1: [(10, 0.9), (11, 0.5 + 1e-12)]})
+
+    assert upserts == []
+    assert deletes == []
+    assert counts == {'inserted': 0, 'updated': 0, 'deleted': 0}
+
+
+def test_changed_new_and_removed_rows():
+    stored = {
+        1: {10: (100, 0.9), 11: (101, 0.5), 12: (102, 0.1)},
+        2: {10: (200, 0.7)}
+    }
+    rankings = {
+        # 10 unchanged, 11 rescored, 12 dropped, 13 new
+        1: [(10, 0.9), (11, 0.6), (13, 0.4)],
+        # No stored rows yet
+        3: [(10, 0.8)]
+    }
+
+    upserts, deletes, counts = diff_rankings(stored, rankings)
+
+    assert sorted(upserts, key=lambda row: (row['user_id'], row['stock_id'])) == [
+        {'user_id': 1, 'stock_id': 11, 'score': 0.6},
+        {'user_id': 1, 'stock_id': 13, 'score': 0.4},
+        {'user_id': 3, 'stock_id': 10, 'score': 0.8}
+    ]
+    assert deletes == [102]
+    assert counts == {'inserted': 2, 'updated': 1, 'deleted': 1}
+
+
+def test_users_not_in_rankings_are_left_alone():
+    stored = {1: {10: (100, 0.9)}, 2: {10: (200, 0.7)}}
+
+    upserts, deletes, _ = diff_rankings(stored, {1: [(10, 0.9)]})
+
+    assert upserts == []
+    assert deletes == []
+
+
+def test_empty_ranking_deletes_every_stored_row():
+    stored = {1: {10: (100, 0.9), 11: (101, 0.5)}}
+
+    upserts, deletes, counts = diff_rankings(stored, {1: []})
+
+    assert upserts == []
+    assert sorted(deletes) == [100, 101]
+    assert counts['deleted'] == 2
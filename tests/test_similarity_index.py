@@ -0,0 +1,111 @@
+"""Similarity index backends against exact top-k"""
+import numpy as np
+import pytest
+
+from similarity_index import ExactIndex, IVFIndex
+
+DIM = 12
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    return np.arange(1, 2001), rng.standard_normal((2000, DIM)), rng.standard_normal((50, DIM))
+
+
+def exact_top_k(ids, vectors, queries, k, exclude=()):
+    """Reference ranking by plain cosine similarity"""
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    scores[:, np.isin(ids, list(exclude))] = -np.inf
+    return ids[np.argsort(-scores, axis=1, kind='stable')[:, :k]]
+
+
+def build(cls, ids, vectors, **kwargs):
+    index = cls(DIM, **kwargs)
+    index.add(ids, vectors)
+    return index
+
+
+def test_exact_index_matches_reference(data):
+    ids, vectors, queries = data
+
+    found, scores = build(ExactIndex, ids, vectors).search_many(queries, 10)
+
+    np.testing.assert_array_equal(found, exact_top_k(ids, vectors, queries, 10))
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_ivf_probing_every_list_is_exact(data):
+    ids, vectors, queries = data
+
+    found, _ = build(IVFIndex, ids, vectors, n_lists=16, n_probe=16).search_many(queries, 10)
+
+    np.testing.assert_array_equal(found, exact_top_k(ids, vectors, queries, 10))
+
+
+def test_ivf_recall_against_exact(data):
+    ids, vectors, queries = data
+    expected = exact_top_k(ids, vectors, queries, 10)
+
+    found, _ = build(IVFIndex, ids, vectors, n_lists=16, n_probe=8).search_many(queries, 10)
+
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(found, expected)])
+    assert recall >= 0.9
+
+
+@pytest.mark.parametrize('cls', [ExactIndex, IVFIndex])
+def test_add_existing_id_replaces_its_vector(cls, data):
+    ids, vectors, queries = data
+    index = build(cls, ids, vectors)
+
+    index.add([7], queries[:1])
+
+    assert len(index) == len(ids)
+    found, scores = index.search(queries[0], 3)
+    assert found[0] == 7
+    assert scores[0] == pytest.approx(1.0)
+    assert list(found).count(7) == 1
+
+
+@pytest.mark.parametrize('cls', [ExactIndex, IVFIndex])
+def test_remove(cls, data):
+    ids, vectors, queries = data
+    index = build(cls, ids, vectors)
+    removed = exact_top_k(ids, vectors, queries[:1], 5)[0]
+
+    index.remove(list(removed) + [99999])
+
+    assert len(index) == len(ids) - 5
+    assert removed[0] not in index
+    found, _ = index.search(queries[0], 10)
+    assert not set(found) & set(removed)
+
+
+@pytest.mark.parametrize('cls', [ExactIndex, IVFIndex])
+def test_remove_most_items_compacts_and_still_ranks_exactly(cls, data):
+    ids, vectors, queries = data
+    index = build(cls, ids, vectors)
+    keep = ids % 4 == 0
+
+    index.remove(ids[~keep])
+
+    assert len(index) == keep.sum()
+    # Ranking every remaining item makes each backend scan them all
+    k = int(keep.sum())
+    found, _ = index.search_many(queries, k)
+    np.testing.assert_array_equal(found, exact_top_k(ids[keep], vectors[keep], queries, k))
+
+
+@pytest.mark.parametrize('cls', [ExactIndex, IVFIndex])
+def test_exclude_ids(cls, data):
+    ids, vectors, queries = data
+    index = build(cls, ids, vectors, **({'n_probe': 64} if cls is IVFIndex else {}))
+    excluded = set(exact_top_k(ids, vectors, queries[:1], 5)[0].tolist())
+
+    found, _ = index.search(queries[0], 10, exclude_ids=excluded)
+
+    assert len(found) == 10
+    assert not set(found.tolist()) & excluded
+    np.testing.assert_array_equal(found, exact_top_k(ids, vectors, queries[:1], 10, exclude=excluded)[0])
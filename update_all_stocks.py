@@ -8,6 +8,8 @@ import schedule
 from dotenv import load_dotenv
 from app import app
 from historical_data_fetcher_av import get_all_stocks_and_update_history
+from price_store import PRICE_STORE_PATH, build_snapshot
+from stock_features import update_stock_features
 
 # Load environment variables
 load_dotenv()
@@ -19,11 +21,19 @@ logger = logging.getLogger(__name__)
 def update_all_stocks():
     with app.app_context():
         logger.info("Starting update for all stocks...")
-        results = get_all_stocks_and_update_history()
+        # Only fetch what is missing since each stock's latest stored day
+        results = get_all_stocks_and_update_history(incremental=True)
         logger.info("Update Results:")
         for symbol, success in results.items():
             logger.info(f"{symbol}: {'Success' if success else 'Failed'}")
 
+    # Append the new days to the shared price matrix snapshot
+    store = build_snapshot(PRICE_STORE_PATH) if PRICE_STORE_PATH else None
+
+    # Recompute recommender features from the day's prices
+    with app.app_context():
+        update_stock_features(store)
+
 
 def schedule_updates():
     # Schedule the update to run daily at 5:00 AM
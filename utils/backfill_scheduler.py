@@ -0,0 +1,193 @@
+"""
+Concurrent, rate-limit-aware historical backfill.
+
+Fetches run on a thread pool paced by the Alpha Vantage rate limiter and
+capped by the daily quota shared across processes, while the calling thread
+writes completed symbols to the database, so network latency and DB writes
+overlap. Symbols are processed stalest history first and progress is
+checkpointed to disk so an interrupted run resumes where it stopped; the
+checkpoint belongs to that one run and is dropped once the run completes.
+"""
+import os
+import json
+import logging
+import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+from historical_data_fetcher_av import ApiBudgetExhausted, fetch_historical_data, save_historical_data, last_trading_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROGRESS_FILE = os.getenv('BACKFILL_PROGRESS_FILE', 'backfill_progress.json')
+
+# An interrupted run older than this is abandoned rather than resumed
+MAX_RESUME_AGE = datetime.timedelta(days=3)
+
+class BackfillScheduler:
+    def __init__(self, period: str = "1y", workers: int = 4,
+                 progress_file: Optional[str] = DEFAULT_PROGRESS_FILE,
+                 fetch: Callable[..., pd.DataFrame] = fetch_historical_data,
+                 incremental: bool = False):
+        """
+        Args:
+            period (str): Period of historical data to fetch per symbol
+            workers (int): Concurrent fetches; the rate limiter still caps call volume
+            progress_file (str): JSON checkpoint path, or None to disable resuming
+            fetch (callable): Fetch function, replaceable for testing
+            incremental (bool): Skip symbols current for the last trading session and
+                                fetch only the days missing for the rest
+        """
+        self.period = period
+        self.incremental = incremental
+        self.workers = workers
+        self.progress_file = progress_file
+        self.fetch = fetch
+        self._run = {}
+
+    def stale_symbols(self, latest_dates: Optional[Dict[str, Optional[datetime.date]]] = None) -> List[str]:
+        """
+        All stock symbols ordered by the latest stored history date, never-backfilled first.
+        
+        Args:
+            latest_dates (Dict[str, datetime.date]): Latest stored date per symbol, queried if None
+            
+        Returns:
+            List[str]: Stock ticker symbols
+        """
+        if latest_dates is None:
+            from history_queries import get_latest_dates_by_symbol
+            latest_dates = get_latest_dates_by_symbol()
+        return sorted(
+            (symbol for symbol in latest_dates if symbol),
+            key=lambda symbol: (latest_dates[symbol] is not None, latest_dates[symbol] or datetime.date.min, symbol)
+        )
+
+    def _run_key(self) -> Dict[str, Any]:
+        """What identifies a run: its period and mode, plus the target session for incremental runs"""
+        key = {'period': self.period, 'incremental': self.incremental}
+        if self.incremental:
+            # Each trading session is a new incremental run; yesterday's successes are stale today
+            key['session'] = last_trading_session().isoformat()
+        return key
+
+    def _start_run(self) -> Dict[str, bool]:
+        """
+        Resume the interrupted run recorded in the checkpoint, or start a new one.
+        
+        Returns:
+            Dict[str, bool]: Results already recorded by the resumed run, empty for a new run
+        """
+        self._run = {
+            'run_id': uuid.uuid4().hex,
+            'key': self._run_key(),
+            'started_at': datetime.datetime.utcnow().isoformat()
+        }
+        if not self.progress_file or not os.path.exists(self.progress_file):
+            return {}
+        try:
+            with open(self.progress_file) as f:
+                progress = json.load(f)
+            started_at = datetime.datetime.fromisoformat(progress['started_at'])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable backfill progress file: {e}")
+            return {}
+        
+        # Checkpoints of other runs, or of runs too old to be worth resuming, do not apply
+        if progress.get('key') != self._run['key'] or datetime.datetime.utcnow() - started_at > MAX_RESUME_AGE:
+            logger.info(f"Discarding backfill checkpoint of run {progress.get('run_id')}")
+            return {}
+        
+        self._run.update(run_id=progress['run_id'], started_at=progress['started_at'])
+        logger.info(f"Resuming backfill run {self._run['run_id']} started at {self._run['started_at']}")
+        return progress.get('results', {})
+
+    def _save_progress(self, results: Dict[str, bool]) -> None:
+        if not self.progress_file:
+            return
+        tmp_path = f"{self.progress_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(self._run, updated_at=datetime.datetime.utcnow().isoformat(), results=results), f)
+        # Atomic replace so a crash never leaves a half-written checkpoint
+        os.replace(tmp_path, self.progress_file)
+
+    def _clear_progress(self) -> None:
+        if self.progress_file and os.path.exists(self.progress_file):
+            os.remove(self.progress_file)
+
+    def run(self, symbols: Optional[List[str]] = None) -> Dict[str, bool]:
+        """
+        Backfill historical data for the given symbols, or for every stock.
+        
+        Args:
+            symbols (List[str]): Symbols to backfill, all stocks by oldest stored history first if None
+            
+        Returns:
+            Dict[str, bool]: Dictionary mapping symbols to success status
+        """
+        # The app (and its database) is only needed once a run starts
+        from app import app
+        from history_queries import get_latest_dates_by_symbol
+        
+        with app.app_context():
+            # Latest stored date for every symbol in one query; orders the backfill and bounds incremental fetches
+            latest_dates = get_latest_dates_by_symbol(symbols)
+            if symbols is None:
+                symbols = self.stale_symbols(latest_dates)
+            
+            results = self._start_run()
+            pending = [symbol for symbol in symbols if not results.get(symbol)]
+            if len(pending) < len(symbols):
+                logger.info(f"{len(symbols) - len(pending)} symbols already done by the resumed run")
+            
+            if self.incremental:
+                session = last_trading_session()
+                current = {symbol for symbol in pending if latest_dates.get(symbol) and latest_dates[symbol] >= session}
+                for symbol in current:
+                    results[symbol] = True
+                pending = [symbol for symbol in pending if symbol not in current]
+                logger.info(f"{len(current)} symbols current for {session}, {len(pending)} to update")
+            
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {
+                    executor.submit(self.fetch, symbol, self.period,
+                                    since=latest_dates.get(symbol) if self.incremental else None): symbol
+                    for symbol in pending
+                }
+                
+                # Write each symbol as soon as its fetch completes while the others keep downloading
+                exhausted = False
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    symbol = futures[future]
+                    try:
+                        results[symbol] = save_historical_data(symbol, future.result())
+                    except ApiBudgetExhausted as e:
+                        # Leave the remaining symbols unrecorded so resuming the run picks them up
+                        if not exhausted:
+                            logger.warning(f"Stopping backfill run {self._run['run_id']}: {e}")
+                            exhausted = True
+                            for other in futures:
+                                other.cancel()
+                        continue
+                    except Exception as e:
+                        logger.error(f"Error backfilling {symbol}: {e}")
+                        results[symbol] = False
+                    self._save_progress(results)
+            
+            # The run is over unless the quota cut it short; symbols that failed are retried
+            # from scratch by the next run
+            if not exhausted:
+                self._clear_progress()
+            
+            return {symbol: results.get(symbol, False) for symbol in symbols}
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print("Starting historical backfill...")
+    results = BackfillScheduler().run()
+    print("\nBackfill Results:")
+    for symbol, success in results.items():
+        print(f"{symbol}: {'Success' if success else 'Failed'}")
@@ -4,12 +4,12 @@ Module for fetching historical stock data from Alpha Vantage API
 import os
 import logging
 import datetime
-import time
+from zoneinfo import ZoneInfo
 from typing import Dict, List, Optional, Union, Any
 import pandas as pd
 import requests
 from dotenv import load_dotenv
-from app import app, db
+from rate_limiter import SharedBudget
 
 # Load environment variables
 load_dotenv()
@@ -18,60 +18,112 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Alpha Vantage API configuration
-ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
-if not ALPHA_VANTAGE_API_KEY:
-    raise ValueError("ALPHA_VANTAGE_API_KEY not found in environment variables")
+# Alpha Vantage API configuration; the key is checked on the first call (get_api_key), so the
+# module imports without a key or the app database, e.g. against a local stand-in server
+BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL', "https://www.alphavantage.co/query")
 
-BASE_URL = "https://www.alphavantage.co/query"
+# Both Alpha Vantage quotas are shared by every process (the scheduled update and any manual
+# backfill): Redis when configured, otherwise lock files. Fetches wait for a free slot in the
+# per-minute window and fail once the daily quota is spent
+api_minute_budget = SharedBudget(
+    'alpha_vantage_minute',
+    int(os.getenv('ALPHA_VANTAGE_MINUTE_LIMIT', 5)),
+    period=60,
+    redis_url=os.getenv('REDIS_URL'),
+    path=os.getenv('ALPHA_VANTAGE_MINUTE_BUDGET_FILE')
+)
+api_budget = SharedBudget(
+    'alpha_vantage_requests',
+    int(os.getenv('ALPHA_VANTAGE_DAILY_LIMIT', 500)),
+    redis_url=os.getenv('REDIS_URL'),
+    path=os.getenv('ALPHA_VANTAGE_BUDGET_FILE')
+)
 
-# API call tracking
-api_calls_today = 0
-last_api_call_time = 0
+# A compact response holds the latest 100 trading days; stay well inside that
+COMPACT_MAX_GAP_DAYS = 100
 
-def fetch_historical_data(symbol: str, period: str = "1y") -> pd.DataFrame:
+# Daily bars are published after the US close
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+DAILY_DATA_READY = datetime.time(16, 30)
+
+class ApiBudgetExhausted(Exception):
+    """The shared daily Alpha Vantage quota has been used up"""
+
+def get_api_key() -> str:
+    """
+    Alpha Vantage API key from the environment.
+    
+    Raises:
+        ValueError: If ALPHA_VANTAGE_API_KEY is not set
+    """
+    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
+    if not api_key:
+        raise ValueError("ALPHA_VANTAGE_API_KEY not found in environment variables")
+    return api_key
+
+def last_trading_session(now: Optional[datetime.datetime] = None) -> datetime.date:
+    """
+    Most recent weekday whose daily bar should already be published.
+    
+    Exchange holidays are not modelled; on a holiday a stale symbol simply
+    costs one call that returns no new rows.
+    
+    Args:
+        now (datetime.datetime): Reference time, current time if None
+        
+    Returns:
+        datetime.date: Date of the last completed trading session
+    """
+    now = now.astimezone(MARKET_TIMEZONE) if now else datetime.datetime.now(MARKET_TIMEZONE)
+    session = now.date()
+    if now.time() < DAILY_DATA_READY:
+        session -= datetime.timedelta(days=1)
+    while session.weekday() >= 5:  # Saturday, Sunday
+        session -= datetime.timedelta(days=1)
+    return session
+
+def fetch_historical_data(symbol: str, period: str = "1y", since: Optional[datetime.date] = None) -> pd.DataFrame:
     """
     Fetch historical stock data for a given symbol using Alpha Vantage API.
     
     Args:
         symbol (str): Stock ticker symbol
         period (str): Period of historical data (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
+        since (datetime.date): Latest date already stored; only rows from this date on are
+                               returned and the smallest output size covering the gap is requested
         
     Returns:
         pd.DataFrame: DataFrame containing historical data
+        
+    Raises:
+        ApiBudgetExhausted: If the shared daily quota is spent; no call is made
+        ValueError: If no API key is configured
     """
-    global api_calls_today, last_api_call_time
-    
-    # Check daily limit
-    if api_calls_today >= 500:
-        logger.error("Daily API call limit reached (500 calls/day)")
-        return pd.DataFrame()
+    api_key = get_api_key()
     
-    # Check rate limit (5 calls/minute)
-    current_time = time.time()
-    if current_time - last_api_call_time < 12:  # 12 seconds = 5 calls/minute
-        sleep_time = 12 - (current_time - last_api_call_time)
-        logger.info(f"Rate limit reached. Waiting {sleep_time:.1f} seconds...")
-        time.sleep(sleep_time)
+    # Spend one call of the shared daily quota, then wait for a slot in the shared minute window
+    if not api_budget.try_consume():
+        raise ApiBudgetExhausted(f"Alpha Vantage daily budget of {api_budget.limit} calls exhausted")
+    api_minute_budget.acquire()
     
     try:
-        # Convert period to Alpha Vantage output size
-        output_size = "full" if period in ["2y", "5y", "10y", "max"] else "compact"
+        # Convert period (or the gap since the last stored day) to Alpha Vantage output size
+        if since is not None:
+            gap_days = (datetime.date.today() - since).days
+            output_size = "compact" if gap_days <= COMPACT_MAX_GAP_DAYS else "full"
+        else:
+            output_size = "full" if period in ["2y", "5y", "10y", "max"] else "compact"
         
         params = {
             "function": "TIME_SERIES_DAILY",
             "symbol": symbol,
             "outputsize": output_size,
-            "apikey": ALPHA_VANTAGE_API_KEY
+            "apikey": api_key
         }
         
-        response = requests.get(BASE_URL, params=params)
+        response = requests.get(BASE_URL, params=params, timeout=30)
         response.raise_for_status()
         
-        # Update API call tracking
-        api_calls_today += 1
-        last_api_call_time = time.time()
-        
         data = response.json()
         
         if "Error Message" in data:
@@ -103,6 +155,11 @@ def fetch_historical_data(symbol: str, period: str = "1y") -> pd.DataFrame:
         # Convert date to date object
         df['date'] = df['date'].dt.date
         
+        # Keep only the missing days; the already stored latest day is kept so the
+        # current price still refreshes and is skipped on insert
+        if since is not None:
+            df = df[df['date'] >= since]
+        
         # Convert numeric columns
         for col in ['open_price', 'high_price', 'low_price', 'close_price', 'volume']:
             df[col] = pd.to_numeric(df[col])
@@ -123,61 +180,71 @@ def store_historical_data(symbol: str, period: str = "1y") -> bool:
     Returns:
         bool: True if successful, False otherwise
     """
+    from app import app
+    
     with app.app_context():
+        from models import Stock
+        
+        if not Stock.query.filter_by(symbol=symbol).first():
+            logger.warning(f"Stock {symbol} not found in database")
+            return False
+        
+        # Fetch historical data
         try:
-            from models import Stock, StockHistory
-            
-            # Find stock in database
-            stock = Stock.query.filter_by(symbol=symbol).first()
-            
-            if not stock:
-                logger.warning(f"Stock {symbol} not found in database")
-                return False
-            
-            # Fetch historical data
             hist_df = fetch_historical_data(symbol, period)
-            
-            if hist_df.empty:
-                logger.warning(f"No historical data fetched for {symbol}")
-                return False
-            
-            # Store each data point
-            count = 0
-            for _, row in hist_df.iterrows():
-                # Check if this data point already exists
-                existing = StockHistory.query.filter_by(
-                    stock_id=stock.id,
-                    date=row['date']
-                ).first()
-                
-                if not existing:
-                    history = StockHistory(
-                        stock_id=stock.id,
-                        date=row['date'],
-                        open_price=float(row['open_price']),
-                        high_price=float(row['high_price']),
-                        low_price=float(row['low_price']),
-                        close_price=float(row['close_price']),
-                        volume=int(row['volume'])
-                    )
-                    db.session.add(history)
-                    count += 1
-            
-            # Update current price
-            if not hist_df.empty:
-                latest_price = float(hist_df.iloc[0]['close_price'])  # Alpha Vantage returns most recent first
-                stock.current_price = latest_price
-                stock.price_updated_at = datetime.datetime.utcnow()
-            
-            db.session.commit()
-            logger.info(f"Stored {count} new historical data points for {symbol}")
-            logger.info(f"Updated current price for {symbol}: {latest_price}")
-            
-            return True
-        except Exception as e:
-            logger.error(f"Error storing historical data for {symbol}: {e}")
-            db.session.rollback()
+        except ApiBudgetExhausted as e:
+            logger.error(f"Error fetching historical data for {symbol}: {e}")
             return False
+        
+        return save_historical_data(symbol, hist_df)
+
+def save_historical_data(symbol: str, hist_df: pd.DataFrame) -> bool:
+    """
+    Store already fetched historical data for a stock and update its current price.
+    
+    Must be called inside an application context.
+    
+    Args:
+        symbol (str): Stock ticker symbol
+        hist_df (pd.DataFrame): Data returned by fetch_historical_data
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    from app import db
+    
+    try:
+        from models import Stock
+        from history_ingest import store_history_frame
+        
+        # Find stock in database
+        stock = Stock.query.filter_by(symbol=symbol).first()
+        
+        if not stock:
+            logger.warning(f"Stock {symbol} not found in database")
+            return False
+        
+        if hist_df.empty:
+            logger.warning(f"No historical data fetched for {symbol}")
+            return False
+        
+        # Store all data points in one statement, skipping days already stored
+        count = store_history_frame(stock.id, hist_df, commit=False)
+        
+        # Update current price
+        latest_price = float(hist_df.iloc[0]['close_price'])  # Alpha Vantage returns most recent first
+        stock.current_price = latest_price
+        stock.price_updated_at = datetime.datetime.utcnow()
+        
+        db.session.commit()
+        logger.info(f"Stored {count} new historical data points for {symbol}")
+        logger.info(f"Updated current price for {symbol}: {latest_price}")
+        
+        return True
+    except Exception as e:
+        logger.error(f"Error storing historical data for {symbol}: {e}")
+        db.session.rollback()
+        return False
 
 def store_multiple_stocks_history(symbols: List[str], period: str = "1y") -> Dict[str, bool]:
     """
@@ -190,35 +257,25 @@ def store_multiple_stocks_history(symbols: List[str], period: str = "1y") -> Dic
     Returns:
         Dict[str, bool]: Dictionary mapping symbols to success status
     """
-    results = {}
+    from backfill_scheduler import BackfillScheduler
     
-    for symbol in symbols:
-        success = store_historical_data(symbol, period)
-        results[symbol] = success
-    
-    return results
+    return BackfillScheduler(period=period).run(symbols)
 
-def get_all_stocks_and_update_history(period: str = "1y") -> Dict[str, bool]:
+def get_all_stocks_and_update_history(period: str = "1y", incremental: bool = False) -> Dict[str, bool]:
     """
     Update historical data for all stocks in the database.
     
     Args:
-        period (str): Period of historical data
+        period (str): Period of historical data for stocks with no stored history
+        incremental (bool): Only fetch days missing since each stock's latest stored date
         
     Returns:
         Dict[str, bool]: Dictionary mapping symbols to success status
     """
-    with app.app_context():
-        from models import Stock
-        all_stocks = Stock.query.all()
-        results = {}
-        
-        for stock in all_stocks:
-            if stock.symbol:
-                success = store_historical_data(stock.symbol, period)
-                results[stock.symbol] = success
-        
-        return results
+    from backfill_scheduler import BackfillScheduler
+    
+    # Symbols are taken from the stocks table, stalest first
+    return BackfillScheduler(period=period, incremental=incremental).run()
 
 if __name__ == "__main__":
     # Example usage